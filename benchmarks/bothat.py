@@ -0,0 +1,48 @@
+"""
+Speedup of the integer black-hat engine of bothat_artifact_removal over the former float64 one.
+The former engine closed every orientation in float64 and channel by channel.
+"""
+import argparse
+
+import numpy as np
+import cv2
+
+from common import SIZES, synthetic_image, measure
+from dermoscopy_preprocessing import artifacts_removal
+from dermoscopy_preprocessing.artifacts_removal.artifacts import __bothat_blackhat__
+from dermoscopy_preprocessing.utils import CIRCLE_KERNEL_5X5, line_kernels
+
+
+def float_blackhat(image, kernels):
+    blur = cv2.medianBlur(image, 3)
+    laplacian = cv2.Laplacian(blur, cv2.CV_64F)
+    difference = blur - laplacian
+    blackhat = sum(cv2.morphologyEx(difference, cv2.MORPH_BLACKHAT, line) for line in kernels)
+    return np.asarray(blackhat, np.uint8)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    kernels = line_kernels()
+
+    print(f"{'size':>11} {'float64 (ms)':>13} {'int16 (ms)':>11} {'removal (ms)':>13} {'gray mask (ms)':>15}")
+    for height, width in SIZES:
+        image = synthetic_image(height, width)
+        rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        planes = cv2.split(rgb)
+
+        assert all(np.array_equal(float_blackhat(plane, kernels), __bothat_blackhat__(plane, kernels))
+                   for plane in planes)
+        old = min(measure(lambda: [float_blackhat(plane, kernels) for plane in planes], args.repeat))
+        new = min(measure(lambda: __bothat_blackhat__(rgb, kernels), args.repeat))
+        removal = min(measure(
+            lambda: artifacts_removal.bothat_artifact_removal(rgb, CIRCLE_KERNEL_5X5), args.repeat))
+        gray = min(measure(lambda: artifacts_removal.bothat_artifact_removal(
+            rgb, CIRCLE_KERNEL_5X5, mask_source='gray'), args.repeat))
+        print(f"{height:>5}x{width:<5} {old * 1000:13.1f} {new * 1000:11.1f} {removal * 1000:13.1f} {gray * 1000:15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Peak resident memory of the split/merge channel processing against the channel execution layer.
+Every measurement runs in a fresh process which loads the image from a .npy file,
+so the reported value is the memory added by the operation over the loaded image.
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+
+import numpy as np
+import cv2
+
+from common import synthetic_image
+from dermoscopy_preprocessing import contrast, edges, ilumination, artifacts_removal
+from dermoscopy_preprocessing.utils import CIRCLE_KERNEL_5X5, SHARPEN_KERNEL
+
+
+def __split__(image):
+    rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    return cv2.split(rgb)
+
+
+def split_sharpen(image):
+    return cv2.merge([cv2.filter2D(channel, -1, SHARPEN_KERNEL) for channel in __split__(image)])
+
+
+def split_equalize_histogram(image):
+    return cv2.merge([cv2.equalizeHist(channel) for channel in __split__(image)])
+
+
+def split_clahe(image):
+    cl = cv2.createCLAHE(3, (3, 3))
+    return cv2.merge([cl.apply(channel) for channel in __split__(image)])
+
+
+def split_morphological_closure(image):
+    channels = [cv2.medianBlur(channel, 5) for channel in __split__(image)]
+    return cv2.merge([cv2.morphologyEx(channel, cv2.MORPH_CLOSE, CIRCLE_KERNEL_5X5) for channel in channels])
+
+
+def split_mul_log(image):
+    channels = [np.asarray(256 - 256 * (1 - channel / 256) ** 5, np.uint8) for channel in __split__(image)]
+    return cv2.merge(channels)
+
+
+OPERATIONS = {
+    "sharpen": (split_sharpen, lambda image: edges.sharpen(image, SHARPEN_KERNEL)),
+    "equalize_histogram": (split_equalize_histogram, contrast.equalize_histogram),
+    "clahe": (split_clahe, contrast.clahe),
+    "morphological_closure": (split_morphological_closure,
+                              lambda image: artifacts_removal.morphological_closure_artifact_removal(
+                                  image, CIRCLE_KERNEL_5X5)),
+    "mul_log": (split_mul_log, ilumination.mul_log_brightness_enhancement),
+}
+
+
+def __rss_kb__(field):
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith(field):
+                return int(line.split()[1])
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def __peak__(args):
+    name, variant, path = args
+    image = np.load(path)
+    func = OPERATIONS[name][variant]
+    func(image[:64, :64].copy())
+
+    # Reset the peak resident set size where the kernel allows it
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+    before = __rss_kb__("VmRSS")
+    func(image)
+    return (__rss_kb__("VmHWM") - before) / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--height", type=int, default=4000)
+    parser.add_argument("--width", type=int, default=6000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "image.npy")
+        np.save(path, synthetic_image(args.height, args.width))
+        image_mb = args.height * args.width * 3 / 2 ** 20
+
+        context = multiprocessing.get_context("spawn")
+        print(f"image {args.height}x{args.width} ({image_mb:.0f} MB)")
+        print(f"{'operation':>22} {'split/merge (MB)':>17} {'channel layer (MB)':>19}")
+        for name in OPERATIONS:
+            with context.Pool(1, maxtasksperchild=1) as pool:
+                before = pool.apply(__peak__, ((name, 0, path),))
+            with context.Pool(1, maxtasksperchild=1) as pool:
+                after = pool.apply(__peak__, ((name, 1, path),))
+            print(f"{name:>22} {before:17.0f} {after:19.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Helpers shared by the benchmark scripts.
+Run the scripts from the repository root, e.g. python benchmarks/window_enhancement.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SIZES = [(256, 256), (512, 512), (1024, 1024), (2048, 2048), (4000, 6000)]
+
+
+def synthetic_image(height, width, seed=0):
+    """
+    Dermoscopy-like BGR image: noisy skin background, a dark lesion and some hairs
+    :param height: Image height
+    :param width: Image width
+    :param seed: Random seed
+    :return: 3D Matrix representing BGR image
+    """
+    rng = np.random.default_rng(seed)
+    image = np.empty((height, width, 3), np.uint8)
+    image[:] = (150, 170, 215)
+
+    center = (width // 2, height // 2)
+    axes = (max(width // 5, 1), max(height // 6, 1))
+    cv2.ellipse(image, center, axes, 20, 0, 360, (60, 75, 115), -1)
+
+    noise = rng.normal(0, 8, image.shape)
+    image = np.asarray(np.clip(image + noise, 0, 255), np.uint8)
+    image = cv2.GaussianBlur(image, (5, 5), 0)
+
+    thickness = max(min(height, width) // 400, 1)
+    for _ in range(12):
+        x1, x2 = rng.integers(0, width, 2)
+        y1, y2 = rng.integers(0, height, 2)
+        cv2.line(image, (int(x1), int(y1)), (int(x2), int(y2)), (30, 25, 25), thickness)
+    return image
+
+
+def measure(func, repeat=5, warmup=1):
+    """
+    Time a function call
+    :param func: Function without arguments
+    :param repeat: Number of timed calls
+    :param warmup: Number of untimed calls before timing
+    :return: List with the duration in seconds of every timed call
+    """
+    for _ in range(warmup):
+        func()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return times
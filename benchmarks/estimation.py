@@ -0,0 +1,50 @@
+"""
+Accuracy and time of the parameters estimated on reduced levels of the image pyramid, against full resolution.
+alpha: relative error of automatic_brightness_and_contrast gain. otsu: absolute error of the threshold of
+clean_remaining_artifacts. weights: fraction of images where histogram_bimodality picks the same weights.
+"""
+import argparse
+
+import numpy as np
+
+from common import synthetic_image, measure
+from dermoscopy_preprocessing import contrast
+from dermoscopy_preprocessing.utils import LazyImage, WEIGTHS, __otsu_threshold__
+from dermoscopy_preprocessing.contrast.contrast import __gray_histogram__
+
+
+def estimate(image, level):
+    image = LazyImage(image).level(level)
+    (alpha, _), = contrast.automatic_brightness_and_contrast_parameters([image])
+    otsu = __otsu_threshold__(__gray_histogram__(image))
+    weights = int(np.nanargmax(contrast.bimodality_scores(image, WEIGTHS)))
+    return alpha, otsu, weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--levels", type=int, default=4)
+    parser.add_argument("--images", type=int, default=8)
+    parser.add_argument("--height", type=int, default=1024)
+    parser.add_argument("--width", type=int, default=1536)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    images = [synthetic_image(args.height, args.width, seed) for seed in range(args.images)]
+    full = [estimate(image, 0) for image in images]
+
+    print(f"{'level':>5} {'pixels':>9} {'time (ms)':>10} {'alpha err':>10} {'otsu err':>9} {'weights':>8}")
+    for level in range(args.levels + 1):
+        # A new LazyImage for each run, so the cached levels are not reused between runs
+        seconds = min(measure(lambda: [estimate(image, level) for image in images], args.repeat))
+        found = np.array([estimate(image, level) for image in images])
+        expected = np.array(full)
+        alpha = np.mean(np.abs(found[:, 0] - expected[:, 0]) / expected[:, 0])
+        otsu = np.mean(np.abs(found[:, 1] - expected[:, 1]))
+        weights = np.mean(found[:, 2] == expected[:, 2])
+        pixels = (args.height >> level) * (args.width >> level)
+        print(f"{level:>5} {pixels:>9} {seconds / len(images) * 1000:10.2f} {alpha:10.4f} {otsu:9.2f} {weights:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Cold start time of the library: every module is imported in a fresh interpreter, as process pool workers
+and command line invocations do. The time of importing numpy and cv2 alone is reported as reference, and
+modules that should only be imported on demand, like matplotlib, are checked not to be loaded.
+  python benchmarks/import_time.py --max-ms 100
+exits with an error if importing a module takes longer than the reference plus 100 ms.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = [
+    'dermoscopy_preprocessing',
+    'dermoscopy_preprocessing.utils',
+    'dermoscopy_preprocessing.contrast',
+    'dermoscopy_preprocessing.edges',
+    'dermoscopy_preprocessing.ilumination',
+    'dermoscopy_preprocessing.artifacts_removal',
+    'dermoscopy_preprocessing.pipeline',
+    'dermoscopy_preprocessing.batch',
+]
+
+# Modules that importing the library must not load
+LAZY_MODULES = ['matplotlib']
+
+SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start, *[name for name in {lazy} if name in sys.modules])
+"""
+
+
+def import_time(module, repeat):
+    """
+    :param module: Name of the module
+    :param repeat: Number of fresh interpreters
+    :return: Minimum seconds of the import, which is the least noisy, and modules of LAZY_MODULES it loaded
+    """
+    times, loaded = [], set()
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', SCRIPT.format(module=module, lazy=LAZY_MODULES)],
+                                cwd=ROOT, capture_output=True, text=True, check=True).stdout.split()
+        times.append(float(output[0]))
+        loaded.update(output[1:])
+    return min(times), sorted(loaded)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--max-ms", type=float, default=None,
+                        help="Maximum milliseconds of an import over the reference")
+    args = parser.parse_args()
+
+    reference, _ = import_time('numpy, cv2', args.repeat)
+    print(f"{'module':>42} {'time (ms)':>10} {'over numpy+cv2':>15}")
+    print(f"{'numpy, cv2':>42} {reference * 1000:10.1f}")
+    failed = False
+    for module in MODULES:
+        seconds, loaded = import_time(module, args.repeat)
+        extra = (seconds - reference) * 1000
+        line = f"{module:>42} {seconds * 1000:10.1f} {extra:15.1f}"
+        if loaded:
+            line += f"  loads {', '.join(loaded)}"
+            failed = True
+        if args.max_ms is not None and extra > args.max_ms:
+            line += "  SLOW"
+            failed = True
+        print(line)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
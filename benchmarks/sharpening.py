@@ -0,0 +1,55 @@
+"""
+Time of edges.unsharp_filter and edges.laplacian against their previous implementations.
+The previous unsharp filter blurred only vertically and wrapped around on overflow, so its results differ.
+"""
+import argparse
+
+import numpy as np
+import cv2
+
+from common import synthetic_image, measure, SIZES
+from dermoscopy_preprocessing import edges
+from dermoscopy_preprocessing.utils import gaussian_kernel
+
+
+def previous_unsharp_filter(image, k):
+    blurred = cv2.filter2D(image, -1, gaussian_kernel(5, 1.5))
+    sub = cv2.subtract(image, blurred)
+    x = image + np.array(k * sub, dtype=np.uint8)
+    return np.array(x, dtype=np.uint8)
+
+
+def previous_laplacian(image):
+    channels = cv2.split(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+    return cv2.merge([cv2.subtract(channel, cv2.Laplacian(channel, -1)) for channel in channels])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--k", type=float, default=2)
+    args = parser.parse_args()
+
+    mask = None
+    print(f"{'size':>11} {'operation':>22} {'previous (ms)':>14} {'current (ms)':>13} {'speedup':>8}")
+    for height, width in SIZES[:4]:
+        image = synthetic_image(height, width)
+        mask = np.zeros((height, width), np.uint8)
+        mask[:, :width // 2] = 255
+        cases = [
+            ("unsharp_filter", lambda: previous_unsharp_filter(image, args.k),
+             lambda: edges.unsharp_filter(image, args.k)),
+            ("unsharp threshold", lambda: previous_unsharp_filter(image, args.k),
+             lambda: edges.unsharp_filter(image, args.k, threshold=4)),
+            ("unsharp mask", lambda: previous_unsharp_filter(image, args.k),
+             lambda: edges.unsharp_filter(image, args.k, mask=mask)),
+            ("laplacian", lambda: previous_laplacian(image), lambda: edges.laplacian(image)),
+        ]
+        for name, previous, current in cases:
+            before = min(measure(previous, args.repeat))
+            after = min(measure(current, args.repeat))
+            print(f"{height:>5}x{width:<5} {name:>22} {before * 1000:14.2f} {after * 1000:13.2f} {before / after:7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
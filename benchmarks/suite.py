@@ -0,0 +1,252 @@
+"""
+Benchmark of every public function of contrast, edges, ilumination and artifacts_removal: the registered
+operations and the public functions outside the registry, like the bimodality search or the hair mask.
+Each operation runs on synthetic dermoscopy-like images of several sizes in a fresh process, which reports
+latency percentiles, throughput and the peak resident memory added by the operation.
+Results are written as JSON, and --compare checks them against the JSON of a previous version:
+  python benchmarks/suite.py --output before.json
+  python benchmarks/suite.py --compare before.json --threshold 0.2
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+import cv2
+
+from common import synthetic_image, measure
+from dermoscopy_preprocessing import contrast, artifacts_removal
+from dermoscopy_preprocessing.pipeline import OPERATIONS
+from dermoscopy_preprocessing.utils import CIRCLE_KERNEL_5X5, SHARPEN_KERNEL, WEIGTHS
+
+DEFAULT_SIZES = ["256x256", "512x512", "1024x1024"]
+
+# Images of a call of automatic_brightness_and_contrast_parameters
+BATCH_IMAGES = 8
+
+
+def __brightness_and_contrast_parameters__(image, **params):
+    # Distinct matrices, so the histogram of every image is computed
+    return contrast.automatic_brightness_and_contrast_parameters(
+        [image if index == 0 else image[::-1] if index % 2 else image[:, ::-1] for index in range(BATCH_IMAGES)],
+        **params)
+
+
+# Functions processing several images per call, counted in their throughput
+IMAGES_PER_CALL = {
+    'contrast.automatic_brightness_and_contrast_parameters': BATCH_IMAGES,
+}
+
+# Every benchmarked function by name: the registered operations and the public functions outside the registry
+FUNCTIONS = {
+    **{name: operation.function for name, operation in OPERATIONS.items()},
+    'contrast.bimodality_scores': contrast.bimodality_scores,
+    'contrast.automatic_brightness_and_contrast_parameters': __brightness_and_contrast_parameters__,
+    'artifacts_removal.bothat_hair_mask': artifacts_removal.bothat_hair_mask,
+}
+
+# Keyword arguments of the functions with required parameters
+PARAMS = {
+    'contrast.window_enhancement': {'window_min': 50, 'window_max': 200},
+    'contrast.histogram_bimodality': {'weights': WEIGTHS},
+    'contrast.bimodality_scores': {'weights': WEIGTHS},
+    'contrast.morphological_contrast_enhancement': {'kernel': CIRCLE_KERNEL_5X5},
+    'contrast.reverse_morphological_contrast_enhancement': {'kernel': CIRCLE_KERNEL_5X5},
+    'edges.sharpen': {'kernel': SHARPEN_KERNEL},
+    'edges.unsharp_filter': {'k': 2},
+    'artifacts_removal.morphological_closure_artifact_removal': {'kernel': CIRCLE_KERNEL_5X5},
+    'artifacts_removal.dull_razor_artifact_removal': {'kernel': CIRCLE_KERNEL_5X5},
+    'artifacts_removal.bothat_artifact_removal': {'kernel': CIRCLE_KERNEL_5X5},
+    'artifacts_removal.bothat_hair_mask': {'kernel': CIRCLE_KERNEL_5X5},
+}
+
+# Operations too slow for the bigger sizes only run up to this number of pixels, unless --all-sizes is given
+MAX_PIXELS = {
+    'artifacts_removal.clean_remaining_artifacts': 256 * 256,
+}
+
+
+def __rss_kb__(field):
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith(field):
+                return int(line.split()[1])
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def __run__(args):
+    """
+    Benchmark of one operation on one image, run in its own process
+    """
+    name, path, repeat, budget, threads = args
+    if threads is not None:
+        cv2.setNumThreads(threads)
+    image = np.load(path)
+    function, params = FUNCTIONS[name], PARAMS.get(name, {})
+    function(image[:64, :64].copy(), **params)
+
+    # Reset the peak resident set size where the kernel allows it
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+    before = __rss_kb__("VmRSS")
+    start = time.perf_counter()
+    function(image, **params)
+    first = time.perf_counter() - start
+    peak = (__rss_kb__("VmHWM") - before) / 1024
+
+    # Slow operations are timed fewer times to stay within the time budget
+    repeat = max(1, min(repeat, int(budget / first)))
+    times = np.array(measure(lambda: function(image, **params), repeat, warmup=0))
+    megapixels = image.shape[0] * image.shape[1] * IMAGES_PER_CALL.get(name, 1) / 1e6
+    p50, p90, p99 = np.percentile(times, [50, 90, 99])
+    return {
+        'operation': name,
+        'size': f"{image.shape[0]}x{image.shape[1]}",
+        'repeat': repeat,
+        'p50': p50, 'p90': p90, 'p99': p99,
+        'mean': float(times.mean()), 'min': float(times.min()),
+        'images_per_second': IMAGES_PER_CALL.get(name, 1) / p50,
+        'megapixels_per_second': megapixels / p50,
+        'peak_mb': peak,
+    }
+
+
+def __metadata__(threads):
+    return {
+        'date': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count(),
+        'opencv_threads': threads,
+    }
+
+
+def run(operations, sizes, repeat, budget=10, threads=None, all_sizes=False, progress=None):
+    """
+    Benchmark operations on synthetic images
+    :param operations: Names of the functions in FUNCTIONS
+    :param sizes: List of (height, width)
+    :param repeat: Number of timed calls of each operation
+    :param budget: Seconds of timed calls after which an operation is called fewer than repeat times
+    :param threads: Optional number of OpenCV threads
+    :param all_sizes: If True the operations in MAX_PIXELS run on every size too
+    :param progress: Optional function called with each result as soon as it is measured
+    :return: List of result dicts
+    """
+    results = []
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as directory:
+        for height, width in sizes:
+            path = os.path.join(directory, f"{height}x{width}.npy")
+            np.save(path, synthetic_image(height, width))
+            for name in operations:
+                if not all_sizes and height * width > MAX_PIXELS.get(name, height * width):
+                    continue
+                with context.Pool(1, maxtasksperchild=1) as pool:
+                    result = pool.apply(__run__, ((name, path, repeat, budget, threads),))
+                results.append(result)
+                if progress is not None:
+                    progress(result)
+    return results
+
+
+def __format__(result, baseline=None):
+    line = (f"{result['operation']:>56} {result['size']:>11} {result['p50'] * 1000:10.2f} "
+            f"{result['p90'] * 1000:10.2f} {result['p99'] * 1000:10.2f} {result['megapixels_per_second']:8.1f} "
+            f"{result['peak_mb']:9.1f}")
+    if baseline is not None:
+        line += f" {result['p50'] / baseline['p50']:8.2f}x"
+    return line
+
+
+def compare(results, baseline, threshold, memory_threshold=None, min_delta=0.5e-3):
+    """
+    Operations slower than the baseline, or using more memory, by more than a relative threshold
+    :param results: Results of the current version
+    :param baseline: Results of the previous version
+    :param threshold: Allowed relative increase of the median latency, 0.2 allows 20% slower
+    :param memory_threshold: Optional allowed relative increase of the peak memory
+    :param min_delta: Seconds a median latency must increase by to be a regression, which ignores the noise of
+    the fastest operations
+    :return: List of (result, baseline, reason) of the regressions
+    """
+    previous = {(item['operation'], item['size']): item for item in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get((result['operation'], result['size']))
+        if before is None:
+            continue
+        if result['p50'] > before['p50'] * (1 + threshold) and result['p50'] - before['p50'] > min_delta:
+            regressions.append((result, before, 'latency'))
+        if memory_threshold is not None and result['peak_mb'] > max(before['peak_mb'], 1) * (1 + memory_threshold):
+            regressions.append((result, before, 'memory'))
+    return regressions
+
+
+def __size__(text):
+    height, width = text.lower().split("x")
+    return int(height), int(width)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--operations", nargs="+", default=None,
+                        help="Operations to run, by name or name part. All of them by default")
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES, help="Image sizes as HEIGHTxWIDTH")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--budget", type=float, default=10, help="Seconds of timed calls of each measurement")
+    parser.add_argument("--all-sizes", action="store_true", help="Run the slowest operations on every size")
+    parser.add_argument("--threads", type=int, default=None, help="Number of OpenCV threads")
+    parser.add_argument("--output", help="JSON file receiving the results")
+    parser.add_argument("--compare", help="JSON file of a previous run to check regressions against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative latency increase")
+    parser.add_argument("--memory-threshold", type=float, default=None,
+                        help="Allowed relative peak memory increase, not checked by default")
+    parser.add_argument("--min-delta", type=float, default=0.5, help="Ignored latency increases, in milliseconds")
+    args = parser.parse_args()
+
+    operations = [name for name in FUNCTIONS
+                  if args.operations is None or any(part in name for part in args.operations)]
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)['results']
+    previous = {(item['operation'], item['size']): item for item in baseline or []}
+
+    print(f"{'operation':>56} {'size':>11} {'p50 (ms)':>10} {'p90 (ms)':>10} {'p99 (ms)':>10} {'MP/s':>8} "
+          f"{'peak (MB)':>9}" + (f" {'vs base':>9}" if baseline else ""))
+    results = run(operations, [__size__(size) for size in args.sizes], args.repeat, args.budget, args.threads,
+                  args.all_sizes, lambda result: print(__format__(result, previous.get((result['operation'], result['size'])))))
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({'metadata': __metadata__(args.threads), 'results': results}, file, indent=2)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold, args.memory_threshold, args.min_delta / 1000)
+        for result, before, reason in regressions:
+            if reason == 'latency':
+                print(f"REGRESSION {result['operation']} {result['size']}: p50 {before['p50'] * 1000:.2f} ms -> "
+                      f"{result['p50'] * 1000:.2f} ms")
+            else:
+                print(f"REGRESSION {result['operation']} {result['size']}: peak {before['peak_mb']:.1f} MB -> "
+                      f"{result['peak_mb']:.1f} MB")
+        if regressions:
+            sys.exit(1)
+        print(f"No regression over {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
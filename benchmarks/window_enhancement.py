@@ -0,0 +1,57 @@
+"""
+Speedup of the lookup table window_enhancement over the former per pixel loop.
+The loop is only timed up to --reference-max-pixels, bigger sizes report the new implementation only.
+"""
+import argparse
+
+import numpy as np
+import cv2
+
+from common import SIZES, synthetic_image, measure
+from dermoscopy_preprocessing import contrast
+
+
+def loop_window_enhancement(image, window_min, window_max):
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    n, m = len(gray), len(gray[0])
+    arr = np.zeros((n, m))
+
+    Imin, Imax = 0, 255
+    for i in range(n):
+        for j in range(m):
+            value = int(gray[i][j])
+            if value < window_min:
+                arr[i][j] = Imin
+            elif value > window_max:
+                arr[i][j] = Imax
+            else:
+                arr[i][j] = int((value - window_min) * (Imax - Imin) / (window_max - window_min) + Imin)
+    return arr
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--reference-max-pixels", type=int, default=512 * 512)
+    args = parser.parse_args()
+
+    print(f"{'size':>11} {'loop (s)':>10} {'float64 (ms)':>13} {'uint8 (ms)':>11} {'speedup':>9}")
+    for height, width in SIZES:
+        image = synthetic_image(height, width)
+        out = np.empty((height, width), np.uint8)
+
+        new = min(measure(lambda: contrast.window_enhancement(image, 50, 200), args.repeat))
+        new_u8 = min(measure(lambda: contrast.window_enhancement(image, 50, 200, out=out), args.repeat))
+
+        if height * width <= args.reference_max_pixels:
+            expected = loop_window_enhancement(image, 50, 200)
+            assert np.array_equal(expected, contrast.window_enhancement(image, 50, 200))
+            old = min(measure(lambda: loop_window_enhancement(image, 50, 200), repeat=1, warmup=0))
+            loop, speedup = f"{old:10.3f}", f"{old / new:8.0f}x"
+        else:
+            loop, speedup = f"{'-':>10}", f"{'-':>9}"
+        print(f"{height:>5}x{width:<5} {loop} {new * 1000:13.2f} {new_u8 * 1000:11.2f} {speedup}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import json
+import sys
+
+from . import utils
+from .batch import run_batch
+from .pipeline import Pipeline, OPERATIONS
+
+
+def __parse_param__(text):
+    """
+    Parse a key=value parameter. Values are read as JSON, names of kernels in utils are replaced by the kernel
+    and anything else is kept as a string. Ex: clip_limit=3, tile_grid_size=[4,4], kernel=CIRCLE_KERNEL_5X5
+    """
+    key, _, value = text.partition('=')
+    if value.isupper() and hasattr(utils, value):
+        return key, getattr(utils, value)
+    try:
+        return key, json.loads(value)
+    except ValueError:
+        return key, value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m dermoscopy_preprocessing',
+                                     description='Apply an operation or pipeline to a directory of images')
+    parser.add_argument('inputs', help='Directory or glob pattern of the images')
+    parser.add_argument('output_dir', help='Directory where the results are written')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--operation', choices=sorted(OPERATIONS), help='Operation to apply')
+    group.add_argument('--pipeline', help='JSON or YAML pipeline configuration')
+    parser.add_argument('--param', action='append', default=[], metavar='KEY=VALUE',
+                        help='Keyword argument of the operation, can be repeated')
+    parser.add_argument('--workers', type=int, default=None, help='Number of processes, all CPUs by default')
+    parser.add_argument('--max-in-flight', type=int, default=None, help='Maximum number of images in process')
+    parser.add_argument('--no-resume', action='store_true', help='Process images whose result already exists')
+    parser.add_argument('--extension', default='.png', help='Extension of the results')
+    args = parser.parse_args(argv)
+
+    operation = Pipeline.load(args.pipeline) if args.pipeline else args.operation
+    params = dict(__parse_param__(param) for param in args.param)
+
+    def progress(done, total):
+        print(f"\r{done}/{total}", end='', file=sys.stderr, flush=True)
+
+    report = run_batch(operation, args.inputs, args.output_dir, params, args.workers, args.max_in_flight,
+                       not args.no_resume, args.extension, progress)
+
+    print(file=sys.stderr)
+    for path, error in report.errors.items():
+        print(f"{path}: {error}", file=sys.stderr)
+    print(f"processed {report.processed}, skipped {report.skipped}, failed {len(report.errors)} "
+          f"in {report.seconds:.1f}s ({report.images_per_second:.2f} images/s)")
+    return 1 if report.errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,4 @@
-from .artifacts import bothat_artifact_removal
+from .artifacts import bothat_artifact_removal, bothat_hair_mask
 from .artifacts import dull_razor_artifact_removal
 from .artifacts import laplasian_of_gaussian
 from .artifacts import clean_remaining_artifacts
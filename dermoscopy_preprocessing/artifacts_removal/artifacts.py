@@ -1,159 +1,318 @@
 import cv2
 import numpy as np
-from ..utils import __image__
-from ..utils import CIRCLE_KERNEL_5X5
-import math
+from ..utils import __lazy_image__, __map_channels__, __otsu_threshold__, stacked
+from ..utils import line_kernels, log_mask, ellipse_kernel, HAIR_ANGLES
+from ..instrumentation import instrumented, stage
 
 
-def morphological_closure_artifact_removal(image, kernel, blur=True):
+# Inpainting only reads pixels up to the radius away from the mask, and the distances of those pixels
+# depend on the mask up to the radius away too: crops extended twice the radius give the same result
+INPAINT_BLOCK = 8
+INPAINT_MAX_REGIONS = 256
+INPAINT_MAX_AREA = 0.5
+
+# Inpainting methods of the artifact removal functions
+INPAINT_METHODS = {'telea': cv2.INPAINT_TELEA, 'ns': cv2.INPAINT_NS}
+
+
+def __inpaint_regions__(mask, padding):
+    """
+    Disjoint boxes covering the mask components extended by padding pixels.
+    Components are searched in a mask reduced by INPAINT_BLOCK, overlapping boxes are merged.
+    :param mask: 8 bits mask
+    :param padding: Pixels added around every component
+    :return: List of boxes [x0, y0, x1, y1], or None when inpainting the whole image is cheaper
+    """
+    height, width = mask.shape[:2]
+    block = INPAINT_BLOCK
+    blocks = cv2.dilate(mask, np.ones((block, block), np.uint8), anchor=(0, 0))[::block, ::block]
+    count, _, stats, _ = cv2.connectedComponentsWithStats(blocks, connectivity=8, ltype=cv2.CV_32S)
+    if count - 1 > INPAINT_MAX_REGIONS:
+        return None
+
+    boxes = [[max(x * block - padding, 0), max(y * block - padding, 0),
+              min((x + w) * block + padding, width), min((y + h) * block + padding, height)]
+             for x, y, w, h, _ in stats[1:]]
+    merged = True
+    while merged:
+        merged = False
+        regions = []
+        for box in boxes:
+            for region in regions:
+                if box[0] < region[2] and region[0] < box[2] and box[1] < region[3] and region[1] < box[3]:
+                    region[:] = (min(box[0], region[0]), min(box[1], region[1]),
+                                 max(box[2], region[2]), max(box[3], region[3]))
+                    merged = True
+                    break
+            else:
+                regions.append(box)
+        boxes = regions
+
+    area = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in boxes)
+    return boxes if area <= INPAINT_MAX_AREA * height * width else None
+
+
+def __inpaint__(image, mask, radius, dst=None, method='telea'):
+    """
+    Inpainting restricted to padded boxes around the mask components, the same as cv2.inpaint
+    on the whole image. Falls back to the whole image for masks with many or large components.
+    :param image: 8 bits plane or 3D matrix
+    :param mask: 8 bits mask, non zero on the pixels to inpaint
+    :param radius: Inpainting radius
+    :param dst: Optional preallocated matrix with the shape of the image where the result is written
+    :param method: 'telea' or 'ns' (Navier-Stokes)
+    :return: Inpainted image
+    """
+    if method not in INPAINT_METHODS:
+        raise ValueError(f"Unknown inpaint method {method!r}, expected 'telea' or 'ns'")
+    flags = INPAINT_METHODS[method]
+    with stage('inpaint', image):
+        regions = __inpaint_regions__(mask, 2 * max(radius, 1) + 2)
+        if regions is None:
+            return cv2.inpaint(image, mask, radius, flags, dst=dst)
+
+        if dst is None:
+            dst = image.copy()
+        elif dst is not image:
+            np.copyto(dst, image)
+        for x0, y0, x1, y1 in regions:
+            crop = (slice(y0, y1), slice(x0, x1))
+            dst[crop] = cv2.inpaint(image[crop], mask[crop], radius, flags)
+        return dst
+
+
+@stacked
+@instrumented
+def morphological_closure_artifact_removal(image, kernel, blur=True, out=None):
     """
     Artifact removal using morphological closure
-    :param image: Path to Image or 3D Matrix representing RGB image
+    :param image: Path to Image, 3D Matrix representing RGB image or LazyImage
     :param kernel: Kernel
     :param blur: True or False, indicates if a median blur
     should be applied before morphological closure
+    :param out: Optional preallocated matrix with the shape of the image where the result is written
     :return: Resulting image of merging RGB channels after morphological closure
     """
-    _, red, green, blue, _ = __image__(image)
+    rgb = __lazy_image__(image).rgb
 
     if blur:
-        red = cv2.medianBlur(red, 5)
-        green = cv2.medianBlur(green, 5)
-        blue = cv2.medianBlur(blue, 5)
+        blurred = cv2.medianBlur(rgb, 5, dst=out)
+        return cv2.morphologyEx(blurred, cv2.MORPH_CLOSE, kernel, dst=blurred)
+    return cv2.morphologyEx(rgb, cv2.MORPH_CLOSE, kernel, dst=out)
 
-    r1 = cv2.morphologyEx(red, cv2.MORPH_CLOSE, kernel)
-    g1 = cv2.morphologyEx(green, cv2.MORPH_CLOSE, kernel)
-    b1 = cv2.morphologyEx(blue, cv2.MORPH_CLOSE, kernel)
 
-    return cv2.merge((r1, g1, b1))
+def __dull_razor_mask__(image, kernel):
+    with stage('mask', image):
+        blackhat = cv2.morphologyEx(image, cv2.MORPH_BLACKHAT, kernel)
+        _, binary = cv2.threshold(blackhat, 10, 255, cv2.THRESH_BINARY, dst=blackhat)
+        return binary
 
 
-def __dull_razor__(image, kernel):
-    blackhat = cv2.morphologyEx(image, cv2.MORPH_BLACKHAT, kernel)
-    _, binary = cv2.threshold(blackhat, 10, 255, cv2.THRESH_BINARY)
-    return cv2.inpaint(image, binary, 1, cv2.INPAINT_TELEA)
+def __dull_razor__(image, kernel, radius=1, method='telea'):
+    return __inpaint__(image, __dull_razor_mask__(image, kernel), radius, method=method)
 
 
-def dull_razor_artifact_removal(image, kernel):
+@stacked
+@instrumented
+def dull_razor_artifact_removal(image, kernel, mask_mode=None, return_mask=False, out=None, inpaint_radius=1,
+                                inpaint_method='telea'):
     """
     Artifact Removal using Dull Razor method
-    :param image: Path to Image or 3D Matrix representing RGB image
+    :param image: Path to Image, 3D Matrix representing RGB image or LazyImage
     :param kernel: Kernel
-    :return: Resulting image of merging RGB channels after dull razor methd on each channel
-    """
-    _, red, green, blue, _ = __image__(image)
-    r = __dull_razor__(red, kernel)
-    g = __dull_razor__(green, kernel)
-    b = __dull_razor__(blue, kernel)
-
-    return cv2.merge((r, g, b))
-
-
-def __generate_kernels__():
-    kernel1 = np.zeros((9, 9), np.uint8)
-    for i in range(9):
-        for j in range(9):
-            if i == 4:
-                kernel1[i][j] = 1
-    kernel2 = np.zeros((9, 9), np.uint8)
-    for i in range(9):
-        for j in range(9):
-            if j == 4:
-                kernel2[i][j] = 1
-    kernel3 = np.zeros((9, 9), np.uint8)
-    for i in range(9):
-        for j in range(9):
-            if i + j == 8:
-                kernel3[i][j] = 1
-    kernel4 = np.zeros((9, 9), np.uint8)
-    for i in range(9):
-        for j in range(9):
-            if i - j == 0:
-                kernel4[i][j] = 1
-    return kernel1, kernel2, kernel3, kernel4
-
-
-def __bothat__(image, kernel, kernel1, kernel2, kernel3, kernel4):
-    blur = cv2.medianBlur(image, 3)
-    laplacian = cv2.Laplacian(blur, cv2.CV_64F)
-    difference = blur - laplacian
-    bh1 = cv2.morphologyEx(difference, cv2.MORPH_BLACKHAT, kernel1)
-    bh2 = cv2.morphologyEx(difference, cv2.MORPH_BLACKHAT, kernel2)
-    bh3 = cv2.morphologyEx(difference, cv2.MORPH_BLACKHAT, kernel3)
-    bh4 = cv2.morphologyEx(difference, cv2.MORPH_BLACKHAT, kernel4)
-
-    blackhat = bh1 + bh2 + bh3 + bh4
-    blackhat = np.asarray(blackhat, np.uint8)
-
-    th, binary = cv2.threshold(blackhat, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-    dilation = cv2.morphologyEx(binary, cv2.MORPH_DILATE, kernel)
-    return cv2.inpaint(image, dilation, 1, cv2.INPAINT_TELEA)
-
-
-def bothat_artifact_removal(image, kernel):
+    :param mask_mode: None finds a mask on each channel and inpaints each channel with its own mask.
+    'or' joins the masks of the three channels and 'gray' finds the mask on the grayscale image,
+    then the three channels are inpainted at once with that mask
+    :param return_mask: If True the mask is returned too, only with mask_mode
+    :param out: Optional preallocated matrix with the shape of the image where the result is written
+    :param inpaint_radius: Radius of the inpainting
+    :param inpaint_method: 'telea' or 'ns' (Navier-Stokes), the fastest with small radius
+    :return: Resulting image of merging RGB channels after dull razor methd on each channel,
+    and the 8 bits mask of the artifacts if return_mask is True
     """
-    Artifact Removal using Bothat morphological operations
-    :param image: Path to Image or 3D Matrix representing RGB image
-    :param kernel: Kernel
-    :return: Resulting image of merging RGB channels after bothat method on each channel
+    image = __lazy_image__(image)
+
+    if mask_mode is None:
+        if return_mask:
+            raise ValueError("return_mask requires mask_mode 'or' or 'gray'")
+        matrix, order = image.interleaved()
+        return __map_channels__(lambda channel: __dull_razor__(channel, kernel, inpaint_radius, inpaint_method),
+                                matrix, order, out)
+
+    if mask_mode == 'or':
+        masks = __dull_razor_mask__(image.interleaved()[0], kernel)
+        mask = cv2.max(cv2.max(cv2.extractChannel(masks, 0), cv2.extractChannel(masks, 1)),
+                       cv2.extractChannel(masks, 2))
+    elif mask_mode == 'gray':
+        mask = __dull_razor_mask__(image.gray, kernel)
+    else:
+        raise ValueError(f"Unknown mask_mode {mask_mode!r}, expected 'or' or 'gray'")
+
+    result = __inpaint__(image.rgb, mask, inpaint_radius, out, inpaint_method)
+    return (result, mask) if return_mask else result
+
+
+def __generate_kernels__(angles=HAIR_ANGLES):
+    return line_kernels(9, angles)
+
+
+def __bothat_blackhat__(image, line_kernels):
+    """
+    Sum of the blackhats of the image minus its laplacian, with line kernels of several orientations.
+    The sum of blackhats is computed as the sum of closings minus the image once, in 16 bits integers:
+    blur - laplacian lies in [-1020, 1275] so every blackhat lies in [0, 2295].
+    :param image: 8 bits plane, or 3D matrix whose channels are processed at once
+    :param line_kernels: Line kernels of every orientation
+    :return: Sum of blackhats wrapped to 8 bits
     """
-    _, red, green, blue, _ = __image__(image)
-    kernel1, kernel2, kernel3, kernel4 = __generate_kernels__()
+    with stage('blackhat', image):
+        blur = cv2.medianBlur(image, 3)
+        laplacian = cv2.Laplacian(blur, cv2.CV_16S)
+        difference = cv2.subtract(blur, laplacian, dtype=cv2.CV_16S)
 
-    r = __bothat__(red, kernel, kernel1, kernel2, kernel3, kernel4)
-    g = __bothat__(green, kernel, kernel1, kernel2, kernel3, kernel4)
-    b = __bothat__(blue, kernel, kernel1, kernel2, kernel3, kernel4)
+        n = len(line_kernels)
+        depth = np.int16 if n * 2295 <= np.iinfo(np.int16).max else np.int32
+        closings = np.zeros(difference.shape, depth)
+        for line in line_kernels:
+            closings += cv2.morphologyEx(difference, cv2.MORPH_CLOSE, line)
+        closings -= np.multiply(difference, n, dtype=depth)
+        return np.asarray(closings, np.uint8)
 
-    return cv2.merge((r, g, b))
+
+def __bothat_mask__(blackhat, kernel, threshold=None):
+    """
+    Dilated binary mask of a blackhat plane
+    :param blackhat: Blackhat plane
+    :param kernel: Kernel of the dilation
+    :param threshold: Threshold of the blackhat, Otsu threshold by default
+    :return: 8 bits mask, 255 on artifacts
+    """
+    with stage('mask', blackhat):
+        if threshold is None:
+            th, binary = cv2.threshold(blackhat, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        else:
+            th, binary = cv2.threshold(blackhat, threshold, 255, cv2.THRESH_BINARY)
+        return cv2.morphologyEx(binary, cv2.MORPH_DILATE, kernel, dst=binary)
 
 
-def __log_mask__(n, sigma2):
-    arr = np.zeros((n, n))
-    for i in range(n):
-        for j in range(n):
-            x = i - (n - 1) // 2
-            y = j - (n - 1) // 2
-            temp = (x ** 2 + y ** 2) / (2 * sigma2)
-            arr[i][j] = (-1 / (math.pi * sigma2 ** 2)) * (1 - temp) * math.pow(math.e, -temp)
-    return arr
+def __bothat_histograms__(image, region=None, angles=HAIR_ANGLES, mask_source=None):
+    """
+    Histograms of the blackhats from which bothat_artifact_removal computes its Otsu thresholds
+    :param image: Path to Image, 3D Matrix representing RGB image or LazyImage
+    :param region: Optional tuple of row and column slices restricting the histograms
+    :param angles: Orientations of the line kernels in degrees
+    :param mask_source: Plane the mask is computed from, as in bothat_artifact_removal
+    :return: Array of shape (3, 256) with the histogram of each RGB channel, or (1, 256) with mask_source
+    """
+    image = __lazy_image__(image)
+    kernels = __generate_kernels__(angles)
 
+    if mask_source is None:
+        matrix, order = image.interleaved()
+        blackhats = __bothat_blackhat__(matrix, kernels)
+        planes = [cv2.extractChannel(blackhats, channel) for channel in order or range(3)]
+    else:
+        planes = [__bothat_blackhat__(getattr(image, mask_source), kernels)]
 
-def laplasian_of_gaussian(image):
+    region = region or (slice(None), slice(None))
+    return np.array([np.bincount(plane[region].ravel(), minlength=256) for plane in planes])
+
+
+@stacked
+@instrumented
+def bothat_hair_mask(image, kernel, source='gray', threshold=None, angles=HAIR_ANGLES):
     """
-    Artifact Removal using Laplassian of Gaussian method
-    :param image: Path to Image or 3D Matrix representing RGB image
-    :return: Resulting image of merging RGB channels after bothat method on each channel
+    Mask of the artifacts found by the bothat method on one plane of the image
+    :param image: Path to Image, 3D Matrix representing RGB image or LazyImage
+    :param kernel: Kernel of the dilation of the mask
+    :param source: Plane the mask is computed from: 'gray', 'red', 'green' or 'blue'
+    :param threshold: Threshold of the blackhat, Otsu threshold by default
+    :param angles: Orientations in degrees of the line kernels detecting hairs
+    :return: 8 bits mask, 255 on artifacts
     """
-    _, red, green, blue, _ = __image__(image)
-    mask = __log_mask__(11,2)
-    arrayLOG = cv2.filter2D(red, -1, mask)
-    d = cv2.morphologyEx(arrayLOG, cv2.MORPH_DILATE, CIRCLE_KERNEL_5X5)
-    e = cv2.morphologyEx(d, cv2.MORPH_ERODE, CIRCLE_KERNEL_5X5)
+    plane = getattr(__lazy_image__(image), source)
+    return __bothat_mask__(__bothat_blackhat__(plane, __generate_kernels__(angles)), kernel, threshold)
 
-    r = cv2.inpaint(red, e, 3, cv2.INPAINT_TELEA)
 
-    arrayLOG = cv2.filter2D(green, -1, mask)
-    d = cv2.morphologyEx(arrayLOG, cv2.MORPH_DILATE, CIRCLE_KERNEL_5X5)
-    e = cv2.morphologyEx(d, cv2.MORPH_ERODE, CIRCLE_KERNEL_5X5)
-    g = cv2.inpaint(green, e, 3, cv2.INPAINT_TELEA)
+@stacked
+@instrumented
+def bothat_artifact_removal(image, kernel, thresholds=None, angles=HAIR_ANGLES, mask_source=None, out=None,
+                            inpaint_radius=1, inpaint_method='telea'):
+    """
+    Artifact Removal using Bothat morphological operations
+    :param image: Path to Image, 3D Matrix representing RGB image or LazyImage
+    :param kernel: Kernel
+    :param thresholds: Optional tuple or array with the blackhat threshold of channels RGB, or a single threshold
+    for every channel or for the plane of mask_source. The Otsu threshold is used by default
+    :param angles: Orientations in degrees of the line kernels detecting hairs
+    :param mask_source: None finds a mask on each channel and inpaints each channel with its own mask.
+    'gray', 'red', 'green' or 'blue' finds one mask on that plane and inpaints the three channels at once
+    :param out: Optional preallocated matrix with the shape of the image where the result is written
+    :param inpaint_radius: Radius of the inpainting
+    :param inpaint_method: 'telea' or 'ns' (Navier-Stokes)
+    :return: Resulting image of merging RGB channels after bothat method on each channel
+    """
+    image = __lazy_image__(image)
+
+    if mask_source is not None:
+        threshold = thresholds[0] if np.ndim(thresholds) else thresholds
+        mask = bothat_hair_mask(image, kernel, mask_source, threshold, angles)
+        return __inpaint__(image.rgb, mask, inpaint_radius, out, inpaint_method)
+
+    # Blackhats of the three channels at once, then one mask and inpaint per channel
+    matrix, order = image.interleaved()
+    blackhats = __bothat_blackhat__(matrix, __generate_kernels__(angles))
+    if thresholds is None:
+        thresholds = (None, None, None)
+    elif np.ndim(thresholds) == 0:
+        thresholds = (thresholds,) * 3
+
+    out = np.empty(matrix.shape, np.uint8) if out is None else out
+    for index, channel in enumerate(order or range(3)):
+        mask = __bothat_mask__(cv2.extractChannel(blackhats, channel), kernel, thresholds[index])
+        result = __inpaint__(cv2.extractChannel(matrix, channel), mask, inpaint_radius, method=inpaint_method)
+        cv2.insertChannel(result, out, index)
+    return out
+
+
+@stacked
+@instrumented
+def laplasian_of_gaussian(image, out=None, inpaint_radius=3, inpaint_method='telea'):
+    """
+    Artifact Removal using Laplassian of Gaussian method
+    :param image: Path to Image, 3D Matrix representing RGB image or LazyImage
+    :param out: Optional preallocated matrix with the shape of the image where the result is written
+    :param inpaint_radius: Radius of the inpainting
+    :param inpaint_method: 'telea' or 'ns' (Navier-Stokes)
+    :return: Resulting image of merging RGB channels after bothat method on each channel
+    """
+    matrix, order = __lazy_image__(image).interleaved('bgr')
+    mask = log_mask(11, 2)
 
-    arrayLOG = cv2.filter2D(blue, -1, mask)
-    d = cv2.morphologyEx(arrayLOG, cv2.MORPH_DILATE, CIRCLE_KERNEL_5X5)
-    e = cv2.morphologyEx(d, cv2.MORPH_ERODE, CIRCLE_KERNEL_5X5)
-    b = cv2.inpaint(blue, e, 3, cv2.INPAINT_TELEA)
+    def log_inpaint(channel):
+        arrayLOG = cv2.filter2D(channel, -1, mask)
+        d = cv2.morphologyEx(arrayLOG, cv2.MORPH_DILATE, ellipse_kernel(5))
+        e = cv2.morphologyEx(d, cv2.MORPH_ERODE, ellipse_kernel(5), dst=d)
+        return __inpaint__(channel, e, inpaint_radius, method=inpaint_method)
 
-    final = cv2.merge((r, g, b))
-    return cv2.cvtColor(final, cv2.COLOR_BGR2RGB)
+    # Merging RGB channels and converting BGR to RGB leaves the channels in BGR order
+    return __map_channels__(log_inpaint, matrix, order, out)
 
 
-def clean_remaining_artifacts(image):
+@stacked
+@instrumented
+def clean_remaining_artifacts(image, estimation_level=0, inpaint_radius=100, inpaint_method='telea'):
     """
     Method still on development. Use at own risk!
     Remove remaining artifacts from image
-    :param image: Path to Image or 3D Matrix representing RGB image
+    :param image: Path to Image, 3D Matrix representing RGB image or LazyImage
+    :param estimation_level: Level of the image pyramid the Otsu threshold is estimated on, 0 for full resolution
+    :param inpaint_radius: Radius of the inpainting, the time grows with its square
+    :param inpaint_method: 'telea' or 'ns' (Navier-Stokes)
     :return: Image
     """
-    img, *_ = __image__(image)
+    image = __lazy_image__(image)
+    img = image.original
     blur = cv2.GaussianBlur(img, (3, 3), 0)
 
     # convert to hsv and get saturation channel
@@ -163,13 +322,18 @@ def clean_remaining_artifacts(image):
     thresh = cv2.threshold(sat, 50, 255, cv2.THRESH_BINARY)[1]
 
     # apply morphology close and open to make mask
-    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (9, 9))
+    kernel = ellipse_kernel(9)
     morph = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel, iterations=1)
     mask = cv2.morphologyEx(morph, cv2.MORPH_OPEN, kernel, iterations=1)
 
     # do OTSU threshold to get melanoma image
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    otsu = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+    if estimation_level:
+        level = image.level(estimation_level).gray
+        threshold = __otsu_threshold__(cv2.calcHist([level], [0], None, [256], [0, 256]))
+        otsu = cv2.threshold(gray, threshold, 255, cv2.THRESH_BINARY)[1]
+    else:
+        otsu = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
 
     pre_otsu = otsu.copy()
 
@@ -182,5 +346,5 @@ def clean_remaining_artifacts(image):
 
     inpaint = mask - inv_otsu
 
-    img_result = cv2.inpaint(img, inpaint, 100, cv2.INPAINT_TELEA)
+    img_result = __inpaint__(img, inpaint, inpaint_radius, method=inpaint_method)
     return cv2.cvtColor(img_result, cv2.COLOR_BGR2RGB), otsu
@@ -0,0 +1 @@
+from .batch import run_batch, BatchReport
@@ -0,0 +1,154 @@
+import glob
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+import cv2
+
+from ..utils import LazyImage
+from ..pipeline import Pipeline, OPERATIONS, operation_name
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.webp')
+
+# processed: Number of images written
+# skipped: Number of images skipped because their result already existed
+# errors: Dict with the error message of every failed image path
+# seconds: Duration of the batch
+# images_per_second: Throughput over processed images
+BatchReport = namedtuple('BatchReport', ['processed', 'skipped', 'errors', 'seconds', 'images_per_second'])
+
+
+def __inputs__(inputs):
+    """
+    Image paths of a directory, glob pattern or list of paths
+    """
+    if isinstance(inputs, str):
+        if os.path.isdir(inputs):
+            return sorted(os.path.join(inputs, name) for name in os.listdir(inputs)
+                          if name.lower().endswith(IMAGE_EXTENSIONS))
+        return sorted(glob.glob(inputs, recursive=True))
+    return list(inputs)
+
+
+def __output_paths__(paths, output_dir, extension):
+    """
+    Result path of every image, keeping its path relative to the deepest directory containing all the images,
+    so images with the same name in different directories get different results
+    """
+    if not paths:
+        return []
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths])
+    return [os.path.join(output_dir, os.path.splitext(os.path.relpath(os.path.abspath(path), root))[0] + extension)
+            for path in paths]
+
+
+def __init_worker__():
+    # Workers already run in parallel, OpenCV threads would oversubscribe the CPUs
+    cv2.setNumThreads(1)
+
+
+def __process__(operation, params, path, output_path):
+    """
+    Apply an operation to one image and write the result
+    :param operation: Registered operation name or Pipeline
+    :param params: Keyword arguments of the operation
+    :param path: Path to the image
+    :param output_path: Path of the result, written atomically
+    """
+    if isinstance(operation, Pipeline):
+        result, order = operation(LazyImage(path)), operation.output
+    else:
+        result = OPERATIONS[operation].function(LazyImage(path), **params)
+        order = OPERATIONS[operation].output
+    if isinstance(result, tuple):
+        result = result[0]
+
+    if result.dtype != np.uint8:
+        result = np.asarray(np.clip(result, 0, 255), np.uint8)
+    if result.ndim == 3 and order == 'rgb':
+        result = cv2.cvtColor(result, cv2.COLOR_RGB2BGR)
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    root, extension = os.path.splitext(output_path)
+    partial = root + '.partial' + extension
+    if not cv2.imwrite(partial, result):
+        raise OSError(f"Could not write {output_path}")
+    os.replace(partial, output_path)
+
+
+def run_batch(operation, inputs, output_dir, params=None, workers=None, max_in_flight=None, resume=True,
+              extension='.png', progress=None):
+    """
+    Apply an operation or pipeline to every image of a directory in parallel processes
+    :param operation: Operation of the library (function or registered name) or Pipeline
+    :param inputs: Directory, glob pattern or list of image paths
+    :param output_dir: Directory where every result is written with the name of its image, in the subdirectories
+    of the image relative to the deepest directory containing all the images. Images whose results would have
+    the same path, like img.jpg and img.png, are reported as errors and not processed
+    :param params: Dict with keyword arguments of the operation
+    :param workers: Number of worker processes, number of CPUs by default. 0 processes in the calling process
+    :param max_in_flight: Maximum number of images submitted and not finished, which bounds memory. 2 * workers by default
+    :param resume: Skip images whose result already exists in output_dir
+    :param extension: Extension, and format, of the results
+    :param progress: Optional function called with (done, total) after each image
+    :return: BatchReport
+    """
+    if not isinstance(operation, Pipeline):
+        operation = operation_name(operation)
+    params = params or {}
+    os.makedirs(output_dir, exist_ok=True)
+
+    paths = __inputs__(inputs)
+    tasks = list(zip(paths, __output_paths__(paths, output_dir, extension)))
+    errors = {}
+    sources = {}
+    for path, output_path in tasks:
+        sources.setdefault(output_path, []).append(path)
+    for output_path, duplicates in sources.items():
+        if len(duplicates) > 1:
+            for path in duplicates:
+                errors[path] = f"ValueError: {', '.join(duplicates)} would all be written to {output_path}"
+    tasks = [(path, output_path) for path, output_path in tasks if path not in errors]
+
+    if resume:
+        tasks = [(path, output_path) for path, output_path in tasks if not os.path.exists(output_path)]
+    skipped = len(paths) - len(errors) - len(tasks)
+
+    start = time.perf_counter()
+    total = len(tasks)
+
+    def finished(path, error, done):
+        if error is not None:
+            errors[path] = f"{type(error).__name__}: {error}"
+        if progress is not None:
+            progress(done, total)
+
+    if workers == 0:
+        for done, (path, output_path) in enumerate(tasks, 1):
+            try:
+                __process__(operation, params, path, output_path)
+                finished(path, None, done)
+            except Exception as error:
+                finished(path, error, done)
+    else:
+        workers = workers or os.cpu_count()
+        max_in_flight = max_in_flight or 2 * workers
+        pending = {}
+        done = 0
+        with ProcessPoolExecutor(workers, initializer=__init_worker__) as executor:
+            for path, output_path in tasks:
+                if len(pending) >= max_in_flight:
+                    completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in completed:
+                        done += 1
+                        finished(pending.pop(future), future.exception(), done)
+                pending[executor.submit(__process__, operation, params, path, output_path)] = path
+            for future in list(pending):
+                done += 1
+                finished(pending.pop(future), future.exception(), done)
+
+    seconds = time.perf_counter() - start
+    processed = len(paths) - skipped - len(errors)
+    return BatchReport(processed, skipped, errors, seconds, processed / seconds if seconds else 0.0)
@@ -0,0 +1,279 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from ..utils import LazyImage
+from ..pipeline import Pipeline, OPERATIONS, operation_name
+from ..pipeline.pipeline import __encode__, __decode__
+
+# Changed whenever operations change their results, so entries written by previous versions are never hit
+CACHE_VERSION = 2
+
+# hits: Results loaded from the cache
+# misses: Results computed and stored
+# evictions: Entries removed to keep the cache under its size
+# entries: Number of entries in the cache
+# bytes: Size of the entries in the cache
+CacheStats = namedtuple('CacheStats', ['hits', 'misses', 'evictions', 'entries', 'bytes'])
+
+
+def __hash_value__(hasher, value):
+    """
+    Feed a parameter to a hash. Matrices, like kernels, are hashed by their shape, data type and bytes
+    """
+    if isinstance(value, np.ndarray):
+        hasher.update(f"ndarray{value.shape}{value.dtype.str}".encode())
+        hasher.update(np.ascontiguousarray(value).data)
+    elif isinstance(value, dict):
+        hasher.update(b"dict")
+        for key in sorted(value):
+            hasher.update(repr(key).encode())
+            __hash_value__(hasher, value[key])
+    elif isinstance(value, (list, tuple)):
+        hasher.update(f"{type(value).__name__}{len(value)}".encode())
+        for item in value:
+            __hash_value__(hasher, item)
+    else:
+        hasher.update(repr(__encode__(value)).encode())
+
+
+def __encode_extra__(value, arrays):
+    """
+    JSON compatible representation of a value returned with a result. Matrices are appended to arrays, to be
+    stored in their own .npy files, and replaced by their index
+    """
+    if isinstance(value, np.ndarray):
+        arrays.append(value)
+        return {'npy': len(arrays) - 1}
+    if isinstance(value, tuple):
+        return {'tuple': [__encode_extra__(item, arrays) for item in value]}
+    if isinstance(value, list):
+        return [__encode_extra__(item, arrays) for item in value]
+    return __encode__(value)
+
+
+def __decode_extra__(value, arrays):
+    """
+    Value returned with a result from its representation made by __encode_extra__
+    """
+    if isinstance(value, dict) and 'npy' in value:
+        return arrays[value['npy']]
+    if isinstance(value, dict) and 'tuple' in value:
+        return tuple(__decode_extra__(item, arrays) for item in value['tuple'])
+    if isinstance(value, list):
+        return [__decode_extra__(item, arrays) for item in value]
+    return __decode__(value)
+
+
+class ResultCache:
+    """
+    On-disk cache of the results of operations and pipelines, keyed by the input image, the operation
+    and its parameters. Results are stored as uncompressed .npy files and loaded memory-mapped, so a hit costs
+    about mapping a file. Matrices returned with a result, like masks, get their own .npy file and the other
+    values a .json file. The least recently used entries are removed when the cache exceeds its size.
+    Several processes can share a directory: entries are written atomically.
+    Ex:
+        cache = ResultCache("~/.cache/dermoscopy", max_bytes=10 * 2 ** 30)
+        result = cache("contrast.clahe", "path/to/image", clip_limit=3)
+    """
+
+    def __init__(self, directory, max_bytes=2 ** 30, mmap=True, hash_files=False):
+        """
+        :param directory: Directory of the cache, created if needed
+        :param max_bytes: Maximum size of the entries in bytes
+        :param mmap: If True hits are returned as read-only memory-mapped matrices, if False they are read in memory
+        :param hash_files: If True images given as paths are keyed by the hash of their pixels, which requires
+        decoding them. If False they are keyed by their path, size and modification time
+        """
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        self.max_bytes = max_bytes
+        self.mmap = mmap
+        self.hash_files = hash_files
+        self.hits = self.misses = self.evictions = 0
+        self.__lock__ = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Entries ordered from least to most recently used, with their size. Recency is kept across runs in
+        # the modification time of the files
+        entries = []
+        for name in os.listdir(self.directory):
+            # Keys have no dots, unlike the files of the matrices returned with a result and partial files
+            if name.endswith('.npy') and '.' not in name[:-4]:
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime_ns, name[:-4], self.__size__(name[:-4], stat.st_size)))
+        self.__entries__ = OrderedDict((key, size) for _, key, size in sorted(entries))
+        self.bytes = sum(self.__entries__.values())
+
+    def __getstate__(self):
+        # Pickled for worker processes without the counters of this process
+        return {'directory': self.directory, 'max_bytes': self.max_bytes, 'mmap': self.mmap,
+                'hash_files': self.hash_files}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __path__(self, key, extension='.npy'):
+        return os.path.join(self.directory, key + extension)
+
+    def __files__(self, key):
+        """
+        Paths of the files of an entry: the result, the matrices returned with it and the other values
+        """
+        paths = [self.__path__(key)]
+        while os.path.exists(self.__path__(key, f".{len(paths) - 1}.npy")):
+            paths.append(self.__path__(key, f".{len(paths) - 1}.npy"))
+        return paths + [self.__path__(key, '.json')]
+
+    def __size__(self, key, size):
+        return size + sum(os.path.getsize(path) for path in self.__files__(key)[1:] if os.path.exists(path))
+
+    def __remove__(self, key):
+        for path in self.__files__(key):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def key(self, operation, image, params=None):
+        """
+        Key of the result of an operation on an image
+        :param operation: Operation of the library (function or registered name) or Pipeline
+        :param image: Path to Image, 3D Matrix representing image in BGR order or LazyImage
+        :param params: Dict with keyword arguments of the operation
+        :return: Hexadecimal digest
+        """
+        hasher = hashlib.blake2b(digest_size=20)
+        hasher.update(f"v{CACHE_VERSION}".encode())
+        if isinstance(operation, Pipeline):
+            hasher.update(operation.to_json().encode())
+        else:
+            hasher.update(operation_name(operation).encode())
+        __hash_value__(hasher, params or {})
+
+        path = image.path if isinstance(image, LazyImage) else image if isinstance(image, str) else None
+        if path is not None and not self.hash_files:
+            stat = os.stat(path)
+            hasher.update(f"file{os.path.abspath(path)}{stat.st_size}{stat.st_mtime_ns}".encode())
+        else:
+            image = image if isinstance(image, LazyImage) else LazyImage(image)
+            matrix, order = image.interleaved('bgr')
+            hasher.update(b"bgr" if order is None else b"rgb")
+            __hash_value__(hasher, matrix)
+        return hasher.hexdigest()
+
+    def get(self, key):
+        """
+        :param key: Key returned by key
+        :return: Cached result, or None if it is not in the cache
+        """
+        with self.__lock__:
+            if key in self.__entries__:
+                self.__entries__.move_to_end(key)
+            elif os.path.exists(self.__path__(key)):
+                # Stored by another process sharing the directory
+                size = self.__size__(key, os.path.getsize(self.__path__(key)))
+                self.__entries__[key] = size
+                self.bytes += size
+            else:
+                return None
+        try:
+            mmap_mode = 'r' if self.mmap else None
+            result = np.load(self.__path__(key), mmap_mode=mmap_mode)
+            extra = self.__path__(key, '.json')
+            if os.path.exists(extra):
+                with open(extra) as file:
+                    extra = json.load(file)
+                arrays = [np.load(self.__path__(key, f".{index}.npy"), mmap_mode=mmap_mode)
+                          for index in range(extra['arrays'])]
+                result = (result, *__decode_extra__(extra['values'], arrays))
+            os.utime(self.__path__(key))
+        except (OSError, ValueError):
+            # Evicted by another process sharing the directory
+            with self.__lock__:
+                self.bytes -= self.__entries__.pop(key, 0)
+            return None
+        return result
+
+    def put(self, key, result):
+        """
+        Store a result and evict the least recently used entries over max_bytes
+        :param key: Key returned by key
+        :param result: Matrix, or tuple of a matrix and matrices or JSON serializable values as returned by
+        some operations
+        """
+        matrix, extra = (result[0], result[1:]) if isinstance(result, tuple) else (result, None)
+        partial = self.__path__(key, f".{os.getpid()}.{threading.get_ident()}.partial")
+        size = 0
+        if extra is not None:
+            arrays = []
+            values = __encode_extra__(list(extra), arrays)
+            for index, array in enumerate(arrays):
+                np.save(partial + '.npy', np.ascontiguousarray(array))
+                size += os.path.getsize(partial + '.npy')
+                os.replace(partial + '.npy', self.__path__(key, f".{index}.npy"))
+            with open(partial + '.json', 'w') as file:
+                json.dump({'arrays': len(arrays), 'values': values}, file)
+            size += os.path.getsize(partial + '.json')
+            os.replace(partial + '.json', self.__path__(key, '.json'))
+        # The result is written last, as its file marks the entry as complete
+        np.save(partial + '.npy', np.ascontiguousarray(matrix))
+        size += os.path.getsize(partial + '.npy')
+        os.replace(partial + '.npy', self.__path__(key))
+
+        with self.__lock__:
+            self.bytes += size - self.__entries__.pop(key, 0)
+            self.__entries__[key] = size
+            evicted = []
+            while self.bytes > self.max_bytes and len(self.__entries__) > 1:
+                old, old_size = self.__entries__.popitem(last=False)
+                self.bytes -= old_size
+                self.evictions += 1
+                evicted.append(old)
+        for old in evicted:
+            self.__remove__(old)
+
+    def __call__(self, operation, image, **params):
+        """
+        Result of an operation on an image, loaded from the cache or computed and stored
+        :param operation: Operation of the library (function or registered name) or Pipeline
+        :param image: Path to Image, 3D Matrix representing image in BGR order or LazyImage
+        :param params: Keyword arguments of the operation
+        :return: Result of the operation. Hits are read-only when the cache is memory-mapped
+        """
+        key = self.key(operation, image, params)
+        result = self.get(key)
+        if result is not None:
+            with self.__lock__:
+                self.hits += 1
+            return result
+
+        if isinstance(operation, Pipeline):
+            result = operation(image)
+        else:
+            result = OPERATIONS[operation_name(operation)].function(image, **params)
+        self.put(key, result)
+        with self.__lock__:
+            self.misses += 1
+        return result
+
+    def stats(self):
+        """
+        :return: CacheStats with the counters of this process
+        """
+        with self.__lock__:
+            return CacheStats(self.hits, self.misses, self.evictions, len(self.__entries__), self.bytes)
+
+    def clear(self):
+        """
+        Remove every entry of the cache
+        """
+        with self.__lock__:
+            keys = list(self.__entries__)
+            self.__entries__.clear()
+            self.bytes = 0
+        for key in keys:
+            self.__remove__(key)
@@ -1,7 +1,7 @@
 from .contrast import equalize_histogram
 from .contrast import clahe
-from .contrast import automatic_brightness_and_contrast
+from .contrast import automatic_brightness_and_contrast, automatic_brightness_and_contrast_parameters
 from .contrast import window_enhancement
-from .contrast import histogram_bimodality
+from .contrast import histogram_bimodality, bimodality_scores
 from .contrast import morphological_contrast_enhancement
 from .contrast import reverse_morphological_contrast_enhancement
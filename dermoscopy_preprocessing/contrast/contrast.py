@@ -1,202 +1,422 @@
+import threading
+
 import numpy as np
-import matplotlib.pyplot as plt
 import cv2
-from ..utils import __image__
+from functools import lru_cache
+from ..utils import __lazy_image__, __map_channels__, stacked
+from ..instrumentation import instrumented, stage
+
 
+# Conversions to a color space with a luminance plane first, from RGB and BGR, and back to RGB
+LUMINANCE_SPACES = {
+    'lab': (cv2.COLOR_RGB2Lab, cv2.COLOR_BGR2Lab, cv2.COLOR_Lab2RGB),
+    'ycrcb': (cv2.COLOR_RGB2YCrCb, cv2.COLOR_BGR2YCrCb, cv2.COLOR_YCrCb2RGB),
+}
 
-def equalize_histogram(image):
+
+def __equalize_channels__(image, equalize, mode, out):
+    """
+    Apply an equalization of 8 bits planes to the RGB channels or to the luminance of an image
+    :param image: Path to Image, 3D Matrix representing RGB image or LazyImage
+    :param equalize: Function of a plane returning the equalized plane
+    :param mode: 'rgb' equalizes each channel, 'lab' or 'ycrcb' only the luminance plane of that color space
+    :param out: Optional preallocated matrix with the shape of the image where the result is written
+    :return: RGB image
+    """
+    matrix, order = __lazy_image__(image).interleaved()
+    if mode == 'rgb':
+        return __map_channels__(equalize, matrix, order, out)
+    if mode not in LUMINANCE_SPACES:
+        raise ValueError(f"Unknown mode {mode!r}, expected 'rgb', 'lab' or 'ycrcb'")
+
+    from_rgb, from_bgr, to_rgb = LUMINANCE_SPACES[mode]
+    with stage('convert', matrix):
+        converted = cv2.cvtColor(matrix, from_rgb if order is None else from_bgr)
+    cv2.insertChannel(equalize(cv2.extractChannel(converted, 0)), converted, 0)
+    with stage('convert', matrix):
+        return cv2.cvtColor(converted, to_rgb, dst=out)
+
+
+@stacked
+@instrumented
+def equalize_histogram(image, out=None, mode='rgb'):
     """
     Classical Histogram Equalization.
     Histogram Equalization for each RGB channel and merge the results
-    :param image: Path to Image or 3D Matrix representing RGB image
+    :param image: Path to Image, 3D Matrix representing RGB image or LazyImage
+    :param out: Optional preallocated matrix with the shape of the image where the result is written
+    :param mode: 'rgb' equalizes each channel. 'lab' or 'ycrcb' equalize only the luminance, which
+    preserves the hue and processes one plane instead of three
     :return: Image from merging equalized histogram of RGB channels
     """
-    original, red, green, blue, _ = __image__(image)
+    return __equalize_channels__(image, cv2.equalizeHist, mode, out)
+
+
+# CLAHE objects keep buffers between calls and are not thread safe, each thread keeps its own
+__clahe_instances__ = threading.local()
 
-    # Equalize histogram for each channel
-    red_equalized = cv2.equalizeHist(red)
-    green_equalized = cv2.equalizeHist(green)
-    blue_equalized = cv2.equalizeHist(blue)
 
-    return cv2.merge((red_equalized, green_equalized, blue_equalized))
+def __clahe_instance__(clip_limit, tile_grid_size):
+    """
+    CLAHE object of the parameters, created once for each thread
+    """
+    instances = __clahe_instances__.__dict__.setdefault('instances', {})
+    key = (clip_limit, tuple(tile_grid_size))
+    if key not in instances:
+        instances[key] = cv2.createCLAHE(*key)
+    return instances[key]
 
 
-def clahe(image, clip_limit=3, tile_grid_size=(3, 3)):
+@stacked
+@instrumented
+def clahe(image, clip_limit=3, tile_grid_size=(3, 3), out=None, mode='rgb'):
     """
     Contrast Limited Adaptive Histogram Equalization.
     CLAHE applied to each RGB channel and results merged
-    :param image:  Path to Image or 3D Matrix representing RGB image
+    :param image: Path to Image, 3D Matrix representing RGB image or LazyImage
     :param clip_limit: Threshold for contrast limiting.
     :param tile_grid_size: Size of grid for histogram equalization. Input image will be divided into
     equally sized rectangular tiles. tile_grid_size defines the number of tiles in row and column.
+    :param out: Optional preallocated matrix with the shape of the image where the result is written
+    :param mode: 'rgb' applies CLAHE to each channel. 'lab' or 'ycrcb' apply it only to the luminance,
+    which preserves the hue and processes one plane instead of three
     :return: Image from merging clahe of RGB channels
     """
-    original, red, green, blue, _ = __image__(image)
+    # The CLAHE object is looked up for every plane, in the thread that equalizes it
+    return __equalize_channels__(image, lambda plane: __clahe_instance__(clip_limit, tile_grid_size).apply(plane),
+                                 mode, out)
 
-    cl = cv2.createCLAHE(clip_limit, tile_grid_size)
-    red_clahe = cl.apply(red)
-    green_clahe = cl.apply(green)
-    blue_clahe = cl.apply(blue)
 
-    return cv2.merge((red_clahe, green_clahe, blue_clahe))
+def __gray_histogram__(image):
+    """
+    Histogram of the gray levels of an image
+    :param image: Path to Image, 3D Matrix representing RGB image or LazyImage
+    :return: Array with the 256 bins
+    """
+    return cv2.calcHist([__lazy_image__(image).gray], [0], None, [256], [0, 256]).ravel()
 
 
-def automatic_brightness_and_contrast(image, clip_histogram_percent=25):
+def __brightness_and_contrast__(hist, clip_histogram_percent=25):
     """
-    Automatic contrast and image brightness calculated by cumulative function on image histogram
-    :param image: Path to Image or 3D Matrix representing RGB image
-    :param clip_histogram_percent:
-    :return: Image with contrast and brightness enhanced
+    Alpha and beta that stretch the gray levels between the clip points of the cumulative histograms
+    :param hist: Histogram of 256 bins, or 2D array with one histogram per row
+    :param clip_histogram_percent: Percent of the histogram clipped, half on each side
+    :return: Arrays with alpha and beta of every histogram
     """
+    accumulator = np.cumsum(np.asarray(hist, np.float64), axis=-1)
+    maximum = accumulator[..., -1:]
+    clip = clip_histogram_percent * (maximum / 100.0) / 2.0
 
-    original, _, _, _, gray = __image__(image)
-    # Calculate grayscale histogram
-    hist = cv2.calcHist([gray], [0], None, [256], [0, 256])
-    hist_size = len(hist)
+    # Left cut is the first level whose accumulator reaches the clip, right cut the last one below maximum - clip,
+    # the same as np.searchsorted on each sorted row
+    minimum_gray = np.sum(accumulator < clip, axis=-1)
+    maximum_gray = np.sum(accumulator < maximum - clip, axis=-1) - 1
+    if np.any(maximum_gray == minimum_gray):
+        raise ZeroDivisionError("Histogram clip points are the same gray level")
 
-    # Calculate cumulative distribution from the histogram
-    accumulator = [float(hist[0])]
-    for index in range(1, hist_size):
-        accumulator.append(accumulator[index - 1] + float(hist[index]))
+    alpha = 255 / (maximum_gray - minimum_gray)
+    beta = -minimum_gray * alpha
+    return alpha, beta
 
-    # Locate points to clip
-    maximum = accumulator[-1]
-    clip_histogram_percent *= (maximum / 100.0)
-    clip_histogram_percent /= 2.0
 
-    # Locate left cut
-    minimum_gray = 0
-    while accumulator[minimum_gray] < clip_histogram_percent:
-        minimum_gray += 1
+@lru_cache(maxsize=256)
+def __scale_abs_lut__(alpha, beta):
+    """
+    Lookup table of cv2.convertScaleAbs for the 256 levels of 8 bits images
+    """
+    lut = cv2.convertScaleAbs(np.arange(256, dtype=np.uint8), alpha=alpha, beta=beta)
+    lut.flags.writeable = False
+    return lut
 
-    # Locate right cut
-    maximum_gray = hist_size - 1
-    while accumulator[maximum_gray] >= (maximum - clip_histogram_percent):
-        maximum_gray -= 1
 
-    # Calculate alpha and beta values
-    alpha = 255 / (maximum_gray - minimum_gray)
-    beta = -minimum_gray * alpha
+@instrumented
+def automatic_brightness_and_contrast_parameters(images, clip_histogram_percent=25, pooled=False, estimation_level=0):
+    """
+    Alpha and beta of automatic_brightness_and_contrast for several images in one pass over their histograms
+    :param images: Iterable of paths to images, 3D matrices representing RGB images, LazyImage or
+    histograms of 256 bins
+    :param clip_histogram_percent: Percent of the histogram clipped, half on each side
+    :param pooled: If True the histograms of all images are added and a single alpha and beta is computed,
+    to normalize a whole dataset the same way
+    :param estimation_level: Level of the image pyramid the histograms are computed on, 0 for full resolution
+    :return: List of (alpha, beta) tuples, one for each image, or a single (alpha, beta) tuple if pooled
+    """
+    hists = np.array([image if isinstance(image, np.ndarray) and image.ndim == 1 else
+                      __gray_histogram__(__lazy_image__(image).level(estimation_level)) for image in images],
+                     np.float64)
+    if pooled:
+        alpha, beta = __brightness_and_contrast__(hists.sum(axis=0), clip_histogram_percent)
+        return float(alpha), float(beta)
+    alpha, beta = __brightness_and_contrast__(hists, clip_histogram_percent)
+    return [(float(a), float(b)) for a, b in zip(alpha, beta)]
+
+
+@stacked
+@instrumented
+def automatic_brightness_and_contrast(image, clip_histogram_percent=25, alpha=None, beta=None, estimation_level=0):
+    """
+    Automatic contrast and image brightness calculated by cumulative function on image histogram
+    :param image: Path to Image, 3D Matrix representing RGB image or LazyImage
+    :param clip_histogram_percent: Percent of the histogram clipped, half on each side
+    :param alpha: Optional contrast gain, computed with automatic_brightness_and_contrast_parameters
+    for a batch or a dataset. Computed from the histogram of the image by default
+    :param beta: Optional brightness offset, used together with alpha
+    :param estimation_level: Level of the image pyramid alpha and beta are estimated on, 0 for full resolution.
+    Each level uses a quarter of the pixels of the previous one
+    :return: Image with contrast and brightness enhanced, alpha and beta parameters
+    """
+    image = __lazy_image__(image)
+    if alpha is None or beta is None:
+        (alpha, beta), = automatic_brightness_and_contrast_parameters([image], clip_histogram_percent,
+                                                                      estimation_level=estimation_level)
 
-    auto_result = cv2.convertScaleAbs(image, alpha=alpha, beta=beta)
+    auto_result = cv2.LUT(image.original, __scale_abs_lut__(alpha, beta))
     return auto_result, alpha, beta
 
 
-def window_enhancement(image, window_min, window_max):
+@lru_cache(maxsize=None)
+def __window_lut__(window_min, window_max, dtype):
     """
-    Contrast enhancement of gray image by modifying histogram in a range
-    :param image: Path to Image or 3D Matrix representing RGB image
+    Lookup table of window enhancement for the 256 gray levels
     :param window_min: Minimal range of window
     :param window_max: Maximal range of window
-    :return: Image in gray scale with contrast enhanced
+    :param dtype: Data type of the table
+    :return: Read only table with the enhanced value of every gray level
     """
-    _, _, _, _, gray = __image__(image)
-    n, m = len(gray), len(gray[0])
-    arr = np.zeros((n, m))
+    if window_max == window_min:
+        raise ValueError("window_max must be different from window_min")
 
     Imin, Imax = 0, 255
-    for i in range(n):
-        for j in range(m):
-            if gray[i][j] < window_min:
-                arr[i][j] = Imin
-            elif gray[i][j] > window_max:
-                arr[i][j] = Imax
-            else:
-                arr[i][j] = int((gray[i][j] - window_min) * (Imax - Imin) / (window_max - window_min) + Imin)
+    levels = np.arange(256)
+    lut = np.trunc((levels - window_min) * (Imax - Imin) / (window_max - window_min) + Imin)
+    lut[levels > window_max] = Imax
+    lut[levels < window_min] = Imin
+
+    lut = np.asarray(lut, dtype)
+    lut.setflags(write=False)
+    return lut
+
 
-    return arr
+@stacked
+@instrumented
+def window_enhancement(image, window_min, window_max, dtype=np.float64, out=None):
+    """
+    Contrast enhancement of gray image by modifying histogram in a range
+    :param image: Path to Image, 3D Matrix representing RGB image or LazyImage
+    :param window_min: Minimal range of window
+    :param window_max: Maximal range of window
+    :param dtype: Data type of the resulting image, np.uint8 avoids the float64 output
+    :param out: Optional preallocated 2D array where the result is written, its dtype overrides dtype
+    :return: Image in gray scale with contrast enhanced
+    """
+    gray = __lazy_image__(image).gray
+    if out is not None:
+        dtype = out.dtype
+
+    lut = __window_lut__(window_min, window_max, np.dtype(dtype))
+    return cv2.LUT(gray, lut, dst=out)
 
 
 def __calculate_normalized_bcv__(hist):
-    best = 0
-    L = 256
+    """
+    Normalized between class variance of the best threshold, computed for every threshold at once
+    with cumulative sums
+    :param hist: Histogram of 256 bins or 2D array with one histogram per row
+    :return: Normalized BCV of the histogram or array with the normalized BCV of every row
+    """
+    hist = np.asarray(hist, np.float64)
+    single = hist.ndim == 1
+    hist = np.atleast_2d(hist)
+    levels = np.arange(hist.shape[1])
 
-    n = sum(hist)
-    mut = sum(i * hist[i] / n for i in range(L))
-    p1, mu = 0, 0
+    count = np.cumsum(hist, axis=1)
+    n = count[:, -1:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p1 = count / n
+        mu = np.cumsum(hist * levels, axis=1) / n
+        mut = mu[:, -1:]
+        sigma2t = np.sum((levels - mut) ** 2 * hist, axis=1) / n[:, 0]
 
-    sigma2t = sum((i - mut) ** 2 * hist[i] / n for i in range(L))
+        # p1 * p2 * (mu1 - mu2) ** 2 with mu1 = mu / p1 and mu2 = (mut - mu) / p2
+        sigma2b = (mut * p1 - mu) ** 2 / (p1 * (1 - p1))
+        sigma2b[(count == 0) | (count == n)] = 0
 
-    for t in range(L):
-        p1 += hist[t] / n
-        mu += t * hist[t] / n
+        best = sigma2b.max(axis=1) / sigma2t ** 2
+    best[~np.isfinite(best)] = 0
+    return best[0] if single else best
 
-        if p1 == 0 or p1 == 1:
-            continue
-        p2 = 1 - p1
 
-        mu1 = mu / p1
-        mu2 = (mut - mu) / p2
-        sigma2b = p1 * p2 * (mu1 - mu2) ** 2
-        curBCV = sigma2b / sigma2t
+def __color_table__(red, green, blue):
+    """
+    Distinct colors of an image and the number of pixels of each one
+    :param red: Red channel
+    :param green: Green channel
+    :param blue: Blue channel
+    :return: Red, green and blue values of every distinct color and its number of pixels
+    """
+    packed = (np.asarray(red, np.uint32) << 16) | (np.asarray(green, np.uint32) << 8) | blue
+    packed = packed.ravel()
+    if packed.size > 1 << 22:
+        counts = np.bincount(packed, minlength=1 << 24)
+        colors = np.flatnonzero(counts)
+        counts = counts[colors]
+    else:
+        colors, counts = np.unique(packed, return_counts=True)
+    return colors >> 16, (colors >> 8) & 255, colors & 255, counts
+
+
+def __bimodality_search__(red, green, blue, weights, bound=None, batch_elements=1 << 23):
+    """
+    Normalized BCV of the gray image obtained with every weight tuple.
+    Histograms are computed over the distinct colors of the image, so no image is built per weight.
+    :param red: Red channel
+    :param green: Green channel
+    :param blue: Blue channel
+    :param weights: Array of shape (k, 3) with the weights of channels RGB
+    :param bound: Stop once a normalized BCV greater or equal than bound is found
+    :param batch_elements: Maximum number of (weight, color) pairs evaluated at once
+    :return: Array with the normalized BCV of every weight, NaN for weights not evaluated
+    """
+    with stage('color_table', red):
+        r, g, b, counts = __color_table__(red, green, blue)
+    scores = np.full(len(weights), np.nan)
+    batch = max(1, batch_elements // len(counts))
+
+    with stage('bcv_search'):
+        for start in range(0, len(weights), batch):
+            w = weights[start:start + batch]
+            k = len(w)
+            values = r * w[:, 0:1] + g * w[:, 1:2] + b * w[:, 2:3]
+            values = np.asarray(values, np.uint8) + 256 * np.arange(k)[:, None]
 
-        if curBCV > best:
-            best = curBCV
-    return best / sigma2t
+            hist = np.bincount(values.ravel(), np.tile(counts, k), minlength=256 * k)
+            scores[start:start + k] = __calculate_normalized_bcv__(hist.reshape(k, 256))
 
+            if bound is not None and np.max(scores[start:start + k]) >= bound:
+                break
+    return scores
 
-def histogram_bimodality(image, weights):
+
+def __as_weights__(weights):
+    weights = np.asarray(weights, np.float64)
+    return weights.reshape(-1, 3)
+
+
+@instrumented
+def bimodality_scores(image, weights, bound=None, estimation_level=0):
+    """
+    Histogram bimodality measure obtained with every weight tuple
+    :param image: Path to Image, 3D Matrix representing RGB image or LazyImage
+    :param weights: Tuple of 3 values or array of tuples for channels RGB
+    :param bound: Stop once a normalized BCV greater or equal than bound is found
+    :param estimation_level: Level of the image pyramid the scores are computed on, 0 for full resolution
+    :return: Array with the normalized BCV of every weight tuple, NaN for tuples not evaluated
+    """
+    red, green, blue = __lazy_image__(image).level(estimation_level).channels
+    return __bimodality_search__(red, green, blue, __as_weights__(weights), bound)
+
+
+@stacked
+@instrumented
+def histogram_bimodality(image, weights, bound=None, estimation_level=0):
     """
     Contrast enhancement by maximizing histogram bimodality
-    :param image: Path to Image or 3D Matrix representing RGB image
+    :param image: Path to Image, 3D Matrix representing RGB image or LazyImage
     :param weights: Tuple of 3 values or array of tuples for channels RGB.
     The sum of values must be 1. Ex: [(0.6,0.2,0.2),(0.4,0.4,0.2)]
     Avoid zero values for any of the channels
+    :param bound: Optional normalized BCV, the search stops at the first weights reaching it
+    :param estimation_level: Level of the image pyramid the best weights are searched on, 0 for full resolution.
+    The weights found are applied to the full resolution image
     :return: Image with contrast enhanced and best weight obtained
     """
-    original, red, green, blue, _ = __image__(image)
+    image = __lazy_image__(image)
+    weights = __as_weights__(weights)
 
-    bestImage = None
-    maxBCV = 0
-    bestWeight = 0
+    scores = bimodality_scores(image, weights, bound, estimation_level)
+    r, g, b = weights[np.nanargmax(scores)].tolist()
+    red, green, blue = image.channels
 
-    for (r, g, b) in weights:
-        newImage = red * r + green * g + blue * b
-        newImage = np.asarray(newImage, np.uint8)
-        hist = cv2.calcHist([newImage], [0], None, [256], [0, 256])
-        hist = [hist[i][0] for i in range(256)]
+    bestImage = red * r + green * g + blue * b
+    bestImage = np.asarray(bestImage, np.uint8)
+    return cv2.cvtColor(bestImage, cv2.COLOR_BGR2RGB), (r, g, b)
 
-        bcv = __calculate_normalized_bcv__(hist)
-        if bcv > maxBCV:
-            maxBCV = bcv
-            bestImage = newImage
-            bestWeight = (r, g, b)
 
-    return cv2.cvtColor(bestImage, cv2.COLOR_BGR2RGB), bestWeight
+def __kernels__(kernel):
+    """
+    :param kernel: Morphological kernel or list of kernels
+    :return: List of kernels
+    """
+    return [kernel] if isinstance(kernel, np.ndarray) else list(kernel)
 
 
 def __morph_preprocessing__(image, kernel):
     """
-    Calculates tophat and bottomhat of image
-    :param image: Path to Image or 3D Matrix representing RGB image
-    :param kernel: Morphological kernel
-    :return: Original Image, Tophat and Bottomhat
+    Calculates tophat and bottomhat of image. Each erosion and dilation is written in the matrix of the hat
+    computed from it, so no temporary matrix is allocated
+    :param image: Path to Image, 3D Matrix representing RGB image or LazyImage
+    :param kernel: Morphological kernel, or list of kernels to sum the hats over several sizes
+    :return: Original image as returned by interleaved('bgr'), its channel order, tophat and bottomhat.
+    The hats are 8 bits for one kernel and 16 bits sums for several
     """
-    original, *_ = __image__(image)
-    tophat = cv2.morphologyEx(original, cv2.MORPH_TOPHAT, kernel)
-    bottomhat = cv2.morphologyEx(original, cv2.MORPH_BLACKHAT, kernel)
-    return original, tophat, bottomhat
-
-
+    matrix, order = __lazy_image__(image).interleaved('bgr')
+    kernels = __kernels__(kernel)
+    tophats = bottomhats = None
+    with stage('morphology', matrix):
+        for kernel in kernels:
+            tophat = cv2.dilate(cv2.erode(matrix, kernel), kernel)
+            cv2.subtract(matrix, tophat, dst=tophat)
+            bottomhat = cv2.erode(cv2.dilate(matrix, kernel), kernel)
+            cv2.subtract(bottomhat, matrix, dst=bottomhat)
+            if len(kernels) == 1:
+                return matrix, order, tophat, bottomhat
+            if tophats is None:
+                tophats, bottomhats = np.zeros(matrix.shape, np.int16), np.zeros(matrix.shape, np.int16)
+            cv2.add(tophats, tophat, dst=tophats, dtype=cv2.CV_16S)
+            cv2.add(bottomhats, bottomhat, dst=bottomhats, dtype=cv2.CV_16S)
+    return matrix, order, tophats, bottomhats
+
+
+def __morph_combine__(matrix, order, added, subtracted):
+    """
+    Original image plus a hat minus the other, saturated to [0, 255] once as if computed without overflow
+    :return: Result in RGB order
+    """
+    if added.dtype == np.uint8:
+        # One of both differences is 0 in every pixel, so saturating each step gives the exact result
+        result = cv2.add(matrix, cv2.subtract(added, subtracted))
+        cv2.subtract(result, cv2.subtract(subtracted, added, dst=subtracted), dst=result)
+    else:
+        result = cv2.add(matrix, cv2.subtract(added, subtracted), dtype=cv2.CV_8U)
+    # Channels are processed independently, so only the channel order of the result needs fixing
+    return cv2.cvtColor(result, cv2.COLOR_BGR2RGB, dst=result) if order is None else result
+
+
+@stacked
+@instrumented
 def morphological_contrast_enhancement(image, kernel):
     """
     Contrast enhancement usign morphological operations
-    :param image: Path to Image or 3D Matrix representing RGB image
-    :param kernel: Morphological kernel
-    :return: Original image plus tophat image of original minus bottomhat operation of original image
+    :param image: Path to Image, 3D Matrix representing RGB image or LazyImage
+    :param kernel: Morphological kernel, or list of kernels to add the tophats and subtract the bottomhats
+    of every size
+    :return: Original image plus tophat image of original minus bottomhat operation of original image,
+    saturated to [0, 255]
     """
-    original, tophat, bottomhat = __morph_preprocessing__(image, kernel)
-    final = original + tophat - bottomhat
-    return cv2.cvtColor(final, cv2.COLOR_BGR2RGB)
+    matrix, order, tophat, bottomhat = __morph_preprocessing__(image, kernel)
+    return __morph_combine__(matrix, order, tophat, bottomhat)
 
 
+@stacked
+@instrumented
 def reverse_morphological_contrast_enhancement(image, kernel):
     """
     Contrast enhancement usign morphological operations
-    :param image:  Path to Image or 3D Matrix representing RGB image
-    :param kernel: Morphological kernel
-    :return: Original image minus tophat image of original plus bottomhat operation of original image
+    :param image: Path to Image, 3D Matrix representing RGB image or LazyImage
+    :param kernel: Morphological kernel, or list of kernels to subtract the tophats and add the bottomhats
+    of every size
+    :return: Original image minus tophat image of original plus bottomhat operation of original image,
+    saturated to [0, 255]
     """
-    original, tophat, bottomhat = __morph_preprocessing__(image, kernel)
-    final = original - tophat + bottomhat
-    return cv2.cvtColor(final, cv2.COLOR_BGR2RGB)
+    matrix, order, tophat, bottomhat = __morph_preprocessing__(image, kernel)
+    return __morph_combine__(matrix, order, bottomhat, tophat)
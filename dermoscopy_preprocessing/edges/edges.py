@@ -1,53 +1,71 @@
 import numpy as np
 import cv2
-from ..utils import __image__
+from ..utils import __lazy_image__, stacked
+from ..instrumentation import instrumented
 
 
-def sharpen(image, kernel):
+@stacked
+@instrumented
+def sharpen(image, kernel, out=None):
     """
     RGB channels filtering with edge sharpening kernel
-    :param image: Path to Image or 3D Matrix representing RGB image
+    :param image: Path to Image, 3D Matrix representing RGB image or LazyImage
     :param kernel: Edge sharpening kernel
+    :param out: Optional preallocated matrix with the shape of the image where the result is written
     :return: Resulting image from merging RGB filtered channels
     """
-    _, red, green, blue, _ = __image__(image)
+    rgb = __lazy_image__(image).rgb
+    return cv2.filter2D(rgb, -1, kernel, dst=out)
 
-    r_sharp = cv2.filter2D(red, -1, kernel)
-    g_sharp = cv2.filter2D(green, -1, kernel)
-    b_sharp = cv2.filter2D(blue, -1, kernel)
 
-    return cv2.merge((r_sharp, g_sharp, b_sharp))
-
-
-def laplacian(image):
+@stacked
+@instrumented
+def laplacian(image, out=None):
     """
     Edge sharpening subtracting laplacian of RGB channels from original channels
-    :param image: Path to Image or 3D Matrix representing RGB image
+    :param image: Path to Image, 3D Matrix representing RGB image or LazyImage
+    :param out: Optional preallocated matrix with the shape of the image where the result is written
     :return: Resulting image from merging RGB filtered channels
     """
-    _, red, green, blue, _ = __image__(image)
-
-    abbsLaplace_red = cv2.Laplacian(red, -2)
-    abbsLaplace_green = cv2.Laplacian(green, -2)
-    abbsLaplace_blue = cv2.Laplacian(blue, -2)
+    rgb = __lazy_image__(image).rgb
 
-    r = cv2.subtract(red, abbsLaplace_red)
-    g = cv2.subtract(green, abbsLaplace_green)
-    b = cv2.subtract(blue, abbsLaplace_blue)
-    return cv2.merge((r, g, b))
+    abbsLaplace = cv2.Laplacian(rgb, -2, dst=out)
+    return cv2.subtract(rgb, abbsLaplace, dst=abbsLaplace)
 
 
-def unsharp_filter(image, k):
+@stacked
+@instrumented
+def unsharp_filter(image, k, threshold=0, mask=None, out=None):
     """
     Edge enhancement with unsharp method
-    :param image: Path to Image or 3D Matrix representing RGB image
+    :param image: Path to Image, 3D Matrix representing RGB image or LazyImage
     :param k: Multiplication factor
-    :return: Original image plus image with edge enhanced
+    :param threshold: Pixels whose difference with the blurred image is not greater than threshold are left
+    unchanged, so the noise of flat regions is not enhanced
+    :param mask: Optional 2D matrix, only pixels where it is not 0 are enhanced
+    :param out: Optional preallocated matrix with the shape of the image where the result is written
+    :return: Original image plus k times its difference with the blurred image, saturated to [0, 255], in BGR order
     """
-    original, *_ = __image__(image)
-    gauss = cv2.getGaussianKernel(5, 1.5)
-    blurred = cv2.filter2D(original, -1, gauss)
-    sub = cv2.subtract(original, blurred)
+    matrix, order = __lazy_image__(image).interleaved('bgr')
+    blurred = cv2.GaussianBlur(matrix, (5, 5), 1.5)
+    if threshold <= 0 and mask is None:
+        # (1 + k) * original - k * blurred, saturated once
+        result = cv2.addWeighted(matrix, 1 + k, blurred, -k, 0, dst=out)
+    else:
+        sharpened = cv2.addWeighted(matrix, 1 + k, blurred, -k, 0)
+        selected = None
+        if threshold > 0:
+            selected = cv2.compare(cv2.absdiff(matrix, blurred, dst=blurred), threshold, cv2.CMP_GT)
+        if mask is not None:
+            mask = np.asarray(mask, np.uint8)
+            selected = mask if selected is None else cv2.bitwise_and(
+                selected, cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR), dst=selected)
+        if out is None:
+            result = matrix.copy()
+        else:
+            result = out
+            np.copyto(result, matrix)
+        cv2.copyTo(sharpened, selected, dst=result)
 
-    x = original + np.array(k * sub, dtype=np.uint8)
-    return np.array(x, dtype=np.uint8)
+    # Channels are processed independently, so only the channel order of the result needs fixing
+    return result if order is None else cv2.cvtColor(result, cv2.COLOR_RGB2BGR, dst=result)
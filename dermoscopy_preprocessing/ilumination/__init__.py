@@ -1 +1,2 @@
-from .ilumination import automatic_brightness_and_contrast, mul_log_brightness_enhancement
+from .ilumination import automatic_brightness_and_contrast, automatic_brightness_and_contrast_parameters
+from .ilumination import mul_log_brightness_enhancement
@@ -0,0 +1 @@
+from .instrumentation import Record, Profile, profile, add_callback, remove_callback, stage, instrumented
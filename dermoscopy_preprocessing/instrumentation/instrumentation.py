@@ -0,0 +1,203 @@
+import json
+import threading
+import time
+import tracemalloc
+from collections import namedtuple
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+# name: Operation, or stage inside the operations it runs in joined by '/'. Ex: 'contrast.clahe/decode'
+# seconds: Wall time
+# bytes: Peak memory allocated over the memory at the start, None unless memory is traced
+# shape: Shape of the image processed or returned, None if unknown
+Record = namedtuple('Record', ['name', 'seconds', 'bytes', 'shape'])
+
+# Functions called with every Record. Operations and stages only measure themselves when there is one
+__callbacks__ = []
+__memory_callbacks__ = []
+__local__ = threading.local()
+__disabled__ = nullcontext()
+
+
+def add_callback(callback, memory=False):
+    """
+    Start calling a function with the Record of every operation and stage of the library
+    :param callback: Function of a Record
+    :param memory: If True memory allocations are traced with tracemalloc while the callback is registered.
+    Tracing slows down every allocation
+    """
+    if memory:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        __memory_callbacks__.append(callback)
+    __callbacks__.append(callback)
+
+
+def remove_callback(callback):
+    """
+    Stop calling a function added with add_callback
+    """
+    __callbacks__.remove(callback)
+    if callback in __memory_callbacks__:
+        __memory_callbacks__.remove(callback)
+        if not __memory_callbacks__:
+            tracemalloc.stop()
+
+
+def __stack__():
+    stack = getattr(__local__, 'stack', None)
+    if stack is None:
+        stack = __local__.stack = []
+    return stack
+
+
+def __shape__(value):
+    if isinstance(value, tuple):
+        value = next((item for item in value if hasattr(item, 'shape')), None)
+    return getattr(value, 'shape', None)
+
+
+@contextmanager
+def __measure__(label, shape=None):
+    """
+    Measure the code run inside, nested in the operation or stage being measured in the same thread
+    :return: Frame [name, bytes at start, peak bytes seen, shape], the shape can be set inside
+    """
+    stack = __stack__()
+    name = f"{stack[-1][0]}/{label}" if stack else label
+    memory = tracemalloc.is_tracing()
+    current = 0
+    if memory:
+        # The peak is reset for this stage, the peak reached so far is kept for the enclosing one
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1][2] = max(stack[-1][2], peak)
+        tracemalloc.reset_peak()
+
+    frame = [name, current, 0, shape]
+    stack.append(frame)
+    start = time.perf_counter()
+    try:
+        yield frame
+    finally:
+        seconds = time.perf_counter() - start
+        stack.pop()
+        allocated = None
+        if memory and tracemalloc.is_tracing():
+            peak = max(tracemalloc.get_traced_memory()[1], frame[2])
+            allocated = peak - frame[1]
+            if stack:
+                stack[-1][2] = max(stack[-1][2], peak)
+        record = Record(name, seconds, allocated, frame[3])
+        for callback in list(__callbacks__):
+            callback(record)
+
+
+def stage(name, image=None):
+    """
+    Context manager measuring an internal stage of an operation, like decoding or inpainting.
+    Does nothing when no callback is registered.
+    :param name: Name of the stage
+    :param image: Optional image processed by the stage, its shape is recorded
+    """
+    if not __callbacks__:
+        return __disabled__
+    return __measure__(name, getattr(image, 'shape', None))
+
+
+def instrumented(function):
+    """
+    Decorator measuring a public operation of the library, named after its module. Ex: 'contrast.clahe'.
+    The shape of the returned image is recorded. When no callback is registered the function is called directly
+    """
+    name = f"{function.__module__.split('.')[-2]}.{function.__name__}"
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        if not __callbacks__:
+            return function(*args, **kwargs)
+        with __measure__(name) as frame:
+            result = function(*args, **kwargs)
+            frame[3] = __shape__(result)
+        return result
+    return wrapper
+
+
+class Profile:
+    """
+    Records of the operations and stages run while it is registered, aggregated by name
+    """
+
+    def __init__(self):
+        self.records = []
+        self.__lock__ = threading.Lock()
+
+    def __call__(self, record):
+        with self.__lock__:
+            self.records.append(record)
+
+    def stats(self):
+        """
+        :return: Dict with the calls, total, mean and maximum seconds, maximum bytes and total pixels of every name
+        """
+        stats = {}
+        with self.__lock__:
+            records = list(self.records)
+        for record in records:
+            item = stats.setdefault(record.name, {'calls': 0, 'seconds': 0., 'max_seconds': 0., 'max_bytes': None,
+                                                  'pixels': 0})
+            item['calls'] += 1
+            item['seconds'] += record.seconds
+            item['max_seconds'] = max(item['max_seconds'], record.seconds)
+            if record.bytes is not None:
+                item['max_bytes'] = max(item['max_bytes'] or 0, record.bytes)
+            if record.shape is not None and len(record.shape) >= 2:
+                item['pixels'] += record.shape[0] * record.shape[1]
+        for item in stats.values():
+            item['mean_seconds'] = item['seconds'] / item['calls']
+        return stats
+
+    def to_json(self):
+        return json.dumps(self.stats(), indent=2)
+
+    def to_prometheus(self, prefix='dermoscopy_preprocessing'):
+        """
+        :param prefix: Prefix of the metric names
+        :return: Stats in the Prometheus text exposition format
+        """
+        stats = self.stats()
+        metrics = [
+            ('stage_calls_total', 'counter', 'Calls of each operation and stage', 'calls'),
+            ('stage_seconds_total', 'counter', 'Wall time spent in each operation and stage', 'seconds'),
+            ('stage_max_seconds', 'gauge', 'Longest call of each operation and stage', 'max_seconds'),
+            ('stage_pixels_total', 'counter', 'Pixels processed by each operation and stage', 'pixels'),
+            ('stage_max_bytes', 'gauge', 'Peak memory allocated by each operation and stage', 'max_bytes'),
+        ]
+        lines = []
+        for metric, kind, description, key in metrics:
+            lines.append(f"# HELP {prefix}_{metric} {description}")
+            lines.append(f"# TYPE {prefix}_{metric} {kind}")
+            for name, item in stats.items():
+                if item[key] is not None:
+                    label = name.replace('\\', '\\\\').replace('"', '\\"')
+                    lines.append(f'{prefix}_{metric}{{stage="{label}"}} {item[key]}')
+        return '\n'.join(lines) + '\n'
+
+
+@contextmanager
+def profile(memory=False):
+    """
+    Context manager recording the operations and stages run inside it, in every thread
+    Ex:
+        with profile() as stats:
+            clahe(image)
+        print(stats.to_json())
+    :param memory: If True memory allocations are traced too
+    :return: Profile
+    """
+    result = Profile()
+    add_callback(result, memory)
+    try:
+        yield result
+    finally:
+        remove_callback(result)
@@ -0,0 +1,2 @@
+from .pipeline import Pipeline
+from .operations import OPERATIONS, operation_name
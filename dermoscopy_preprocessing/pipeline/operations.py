@@ -0,0 +1,65 @@
+from collections import namedtuple
+
+from .. import contrast, edges, ilumination, artifacts_removal
+
+# Registry of the operations of the library, used to refer to them by name.
+# output: Channel order of the returned image, 'rgb', 'bgr' or 'gray'
+# out: True if the operation writes its 3 channel result in a preallocated out= matrix
+# lut: Optional function of the parameters of a point transform returning its lookup table, or None
+# when the parameters do not make it a point transform. The same table is applied to every channel
+Operation = namedtuple('Operation', ['function', 'output', 'out', 'lut'], defaults=(None,))
+
+
+def __scale_abs_lut__(params):
+    if params.get('alpha') is None or params.get('beta') is None:
+        return None
+    return contrast.contrast.__scale_abs_lut__(params['alpha'], params['beta'])
+
+
+def __mullog_lut__(params):
+    return ilumination.ilumination.__mullog_lut__(params.get('factor', 5))
+
+
+OPERATIONS = {
+    'contrast.equalize_histogram': Operation(contrast.equalize_histogram, 'rgb', True),
+    'contrast.clahe': Operation(contrast.clahe, 'rgb', True),
+    'contrast.automatic_brightness_and_contrast': Operation(contrast.automatic_brightness_and_contrast, 'bgr', False,
+                                                            __scale_abs_lut__),
+    'contrast.window_enhancement': Operation(contrast.window_enhancement, 'gray', False),
+    'contrast.histogram_bimodality': Operation(contrast.histogram_bimodality, 'rgb', False),
+    'contrast.morphological_contrast_enhancement': Operation(contrast.morphological_contrast_enhancement, 'rgb',
+                                                             False),
+    'contrast.reverse_morphological_contrast_enhancement': Operation(
+        contrast.reverse_morphological_contrast_enhancement, 'rgb', False),
+    'edges.sharpen': Operation(edges.sharpen, 'rgb', True),
+    'edges.laplacian': Operation(edges.laplacian, 'rgb', True),
+    'edges.unsharp_filter': Operation(edges.unsharp_filter, 'bgr', True),
+    'ilumination.mul_log_brightness_enhancement': Operation(ilumination.mul_log_brightness_enhancement, 'rgb', True,
+                                                            __mullog_lut__),
+    'ilumination.automatic_brightness_and_contrast': Operation(ilumination.automatic_brightness_and_contrast, 'bgr',
+                                                               False, __scale_abs_lut__),
+    'artifacts_removal.morphological_closure_artifact_removal': Operation(
+        artifacts_removal.morphological_closure_artifact_removal, 'rgb', True),
+    'artifacts_removal.dull_razor_artifact_removal': Operation(artifacts_removal.dull_razor_artifact_removal, 'rgb',
+                                                               True),
+    'artifacts_removal.bothat_artifact_removal': Operation(artifacts_removal.bothat_artifact_removal, 'rgb', True),
+    'artifacts_removal.laplasian_of_gaussian': Operation(artifacts_removal.laplasian_of_gaussian, 'bgr', True),
+    'artifacts_removal.clean_remaining_artifacts': Operation(artifacts_removal.clean_remaining_artifacts, 'rgb',
+                                                             False),
+}
+
+
+def operation_name(function):
+    """
+    Registered name of an operation
+    :param function: Function of the library or its registered name
+    :return: Name of the operation, ex: 'contrast.clahe'
+    """
+    if isinstance(function, str):
+        if function not in OPERATIONS:
+            raise ValueError(f"Unknown operation {function}")
+        return function
+    for name, operation in OPERATIONS.items():
+        if operation.function is function:
+            return name
+    raise ValueError(f"{getattr(function, '__name__', function)} is not an operation of the library")
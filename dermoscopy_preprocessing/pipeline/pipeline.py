@@ -0,0 +1,188 @@
+import json
+
+import numpy as np
+import cv2
+
+from ..utils import LazyImage, __lazy_image__, __map_channels__, compose_luts, is_stack, map_stack
+from .operations import OPERATIONS, operation_name
+
+
+def __encode__(value):
+    """
+    JSON compatible representation of a parameter
+    :param value: Parameter of an operation
+    :return: Value with matrices and data types replaced by dicts
+    """
+    if isinstance(value, np.ndarray):
+        return {'ndarray': value.tolist(), 'dtype': value.dtype.name}
+    if isinstance(value, np.dtype) or (isinstance(value, type) and issubclass(value, np.generic)):
+        return {'dtype': np.dtype(value).name}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return [__encode__(item) for item in value]
+    return value
+
+
+def __decode__(value):
+    """
+    Parameter from its JSON compatible representation
+    :param value: Value produced by __encode__
+    :return: Parameter of an operation
+    """
+    if isinstance(value, dict) and 'ndarray' in value:
+        return np.array(value['ndarray'], value['dtype'])
+    if isinstance(value, dict) and 'dtype' in value:
+        return np.dtype(value['dtype'])
+    if isinstance(value, list):
+        return [__decode__(item) for item in value]
+    return value
+
+
+def __reusable__(result, shape):
+    return isinstance(result, np.ndarray) and result.shape == shape and result.dtype == np.uint8 \
+        and result.flags.c_contiguous
+
+
+class Pipeline:
+    """
+    Ordered list of operations of the library applied one after the other.
+    Each step receives the previous result in the channel order it was produced, so no BGR/RGB
+    conversion is made between steps unless the next operation needs it, and 3 channel results
+    are written in the buffers released by previous steps.
+    Consecutive point transforms, like mul_log_brightness_enhancement, are composed in a single lookup table
+    applied once.
+    A pipeline can be saved as JSON or YAML so the same configuration runs everywhere.
+    """
+
+    def __init__(self, steps):
+        """
+        :param steps: Ordered list of steps. A step is an operation of the library (function or name)
+        or a tuple of the operation and a dict with its keyword arguments.
+        Ex: [(dull_razor_artifact_removal, {'kernel': CIRCLE_KERNEL_5X5}), 'contrast.clahe']
+        """
+        self.steps = []
+        for step in steps:
+            function, params = step if isinstance(step, (tuple, list)) else (step, {})
+            self.steps.append((operation_name(function), dict(params)))
+
+    def __call__(self, image, out=None, workers=None):
+        """
+        Apply every step to an image
+        :param image: Path to Image, 3D Matrix representing RGB image or LazyImage. A N x H x W x 3 matrix or
+        list of matrices is processed as a stack of images, split across threads
+        :param out: Optional preallocated stack receiving the results of a stack
+        :param workers: Number of threads processing a stack, number of CPUs by default
+        :return: Image returned by the last step, or stack of them. Extra values returned by an operation are
+        discarded
+        """
+        if is_stack(image):
+            return map_stack(self, image, out, workers)
+        image = __lazy_image__(image)
+        shape = image.shape
+        released = []
+        result = None
+
+        for steps in self.__point_transforms__():
+            previous = result
+            if len(steps) > 1:
+                lut = compose_luts([OPERATIONS[name].lut(params) for name, params in steps])
+                output = OPERATIONS[steps[-1][0]].output
+                matrix, order = image.interleaved(output)
+                result = __map_channels__(lambda channel: cv2.LUT(channel, lut), matrix, order,
+                                          released.pop() if released else None)
+            else:
+                (name, params), = steps
+                operation = OPERATIONS[name]
+                kwargs = dict(params)
+                if operation.out and released:
+                    kwargs['out'] = released.pop()
+
+                result = operation.function(image, **kwargs)
+                if isinstance(result, tuple):
+                    result = result[0]
+                output = operation.output
+
+            if previous is not result and __reusable__(previous, shape):
+                released.append(previous)
+            image = LazyImage(result, 'gray' if result.ndim == 2 else output)
+        return result
+
+    def __point_transforms__(self):
+        """
+        Steps grouped in runs of consecutive point transforms, any other step is alone in its group
+        """
+        groups = []
+        for name, params in self.steps:
+            lut = OPERATIONS[name].lut
+            point = lut is not None and lut(params) is not None
+            if point and groups and groups[-1][0]:
+                groups[-1][1].append((name, params))
+            else:
+                groups.append((point, [(name, params)]))
+        return [steps for _, steps in groups]
+
+    @property
+    def output(self):
+        """
+        Channel order of the image returned by the pipeline, 'rgb', 'bgr' or 'gray'
+        """
+        return OPERATIONS[self.steps[-1][0]].output
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __repr__(self):
+        return f"Pipeline({[name for name, _ in self.steps]})"
+
+    def to_dict(self):
+        """
+        :return: Dict with the name and parameters of every step, JSON and YAML serializable
+        """
+        return {'steps': [{'operation': name, 'params': {key: __encode__(value) for key, value in params.items()}}
+                          for name, params in self.steps]}
+
+    @classmethod
+    def from_dict(cls, config):
+        """
+        :param config: Dict produced by to_dict
+        :return: Pipeline
+        """
+        return cls([(step['operation'], {key: __decode__(value) for key, value in step.get('params', {}).items()})
+                    for step in config['steps']])
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+    @classmethod
+    def from_json(cls, text):
+        return cls.from_dict(json.loads(text))
+
+    def to_yaml(self):
+        import yaml
+        return yaml.safe_dump(self.to_dict(), sort_keys=False)
+
+    @classmethod
+    def from_yaml(cls, text):
+        import yaml
+        return cls.from_dict(yaml.safe_load(text))
+
+    def save(self, path):
+        """
+        Save the pipeline as YAML if path ends with .yaml or .yml, as JSON otherwise
+        :param path: Path to configuration file
+        """
+        text = self.to_yaml() if path.endswith(('.yaml', '.yml')) else self.to_json()
+        with open(path, 'w') as file:
+            file.write(text)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a pipeline saved with save
+        :param path: Path to JSON or YAML configuration file
+        :return: Pipeline
+        """
+        with open(path) as file:
+            text = file.read()
+        return cls.from_yaml(text) if path.endswith(('.yaml', '.yml')) else cls.from_json(text)
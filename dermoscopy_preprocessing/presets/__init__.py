@@ -0,0 +1,2 @@
+from .presets import PRESETS, PRESET_NAMES, Preset, TuningReport
+from .presets import preset_params, apply_preset, auto_tune, PresetTuner
@@ -0,0 +1,211 @@
+import time
+from collections import namedtuple
+
+import numpy as np
+import cv2
+
+from ..utils import LazyImage, __lazy_image__, ellipse_kernel, WEIGTHS
+from ..pipeline import OPERATIONS, operation_name
+
+# params: Keyword arguments of the operation, the arguments given by the caller take precedence
+# scale: Working resolution relative to the image. Below 1 the operation runs on the reduced image and only
+# the changes it makes are enlarged and added to the image, so untouched pixels keep their full resolution
+Preset = namedtuple('Preset', ['params', 'scale'], defaults=(1,))
+
+PRESET_NAMES = ('fast', 'balanced', 'quality')
+
+# Presets of the artifact removal and contrast operations, from the fastest to the closest to the default
+# behaviour of the library. Operations missing in a preset run with the params of the caller.
+PRESETS = {
+    'quality': {
+        'artifacts_removal.morphological_closure_artifact_removal': Preset({'kernel': ellipse_kernel(5)}),
+        'artifacts_removal.dull_razor_artifact_removal': Preset({'kernel': ellipse_kernel(5)}),
+        'artifacts_removal.bothat_artifact_removal': Preset({'kernel': ellipse_kernel(5)}),
+        'artifacts_removal.laplasian_of_gaussian': Preset({}),
+        'artifacts_removal.clean_remaining_artifacts': Preset({}),
+        'contrast.clahe': Preset({}),
+        'contrast.automatic_brightness_and_contrast': Preset({}),
+        'contrast.histogram_bimodality': Preset({'weights': WEIGTHS}),
+        'contrast.morphological_contrast_enhancement': Preset({'kernel': ellipse_kernel(5)}),
+        'contrast.reverse_morphological_contrast_enhancement': Preset({'kernel': ellipse_kernel(5)}),
+    },
+    'balanced': {
+        'artifacts_removal.morphological_closure_artifact_removal': Preset({'kernel': ellipse_kernel(5)}),
+        'artifacts_removal.dull_razor_artifact_removal': Preset({'kernel': ellipse_kernel(5), 'mask_mode': 'gray'}),
+        'artifacts_removal.bothat_artifact_removal': Preset({'kernel': ellipse_kernel(5), 'mask_source': 'gray'}),
+        'artifacts_removal.laplasian_of_gaussian': Preset({'inpaint_radius': 1}),
+        'artifacts_removal.clean_remaining_artifacts': Preset({'inpaint_radius': 10, 'estimation_level': 1}),
+        'contrast.clahe': Preset({'mode': 'ycrcb'}),
+        'contrast.automatic_brightness_and_contrast': Preset({'estimation_level': 1}),
+        'contrast.histogram_bimodality': Preset({'weights': WEIGTHS, 'estimation_level': 1}),
+        'contrast.morphological_contrast_enhancement': Preset({'kernel': ellipse_kernel(5)}),
+        'contrast.reverse_morphological_contrast_enhancement': Preset({'kernel': ellipse_kernel(5)}),
+    },
+    'fast': {
+        'artifacts_removal.morphological_closure_artifact_removal': Preset({'kernel': ellipse_kernel(3)}, 0.5),
+        'artifacts_removal.dull_razor_artifact_removal': Preset(
+            {'kernel': ellipse_kernel(3), 'mask_mode': 'gray', 'inpaint_method': 'ns'}, 0.5),
+        'artifacts_removal.bothat_artifact_removal': Preset(
+            {'kernel': ellipse_kernel(3), 'mask_source': 'gray', 'angles': (0, 90), 'inpaint_method': 'ns'}, 0.5),
+        'artifacts_removal.laplasian_of_gaussian': Preset({'inpaint_radius': 1, 'inpaint_method': 'ns'}, 0.5),
+        'artifacts_removal.clean_remaining_artifacts': Preset(
+            {'inpaint_radius': 5, 'inpaint_method': 'ns', 'estimation_level': 2}, 0.5),
+        'contrast.clahe': Preset({'mode': 'ycrcb'}),
+        'contrast.automatic_brightness_and_contrast': Preset({'estimation_level': 2}),
+        'contrast.histogram_bimodality': Preset({'weights': WEIGTHS, 'estimation_level': 2}),
+        'contrast.morphological_contrast_enhancement': Preset({'kernel': ellipse_kernel(3)}),
+        'contrast.reverse_morphological_contrast_enhancement': Preset({'kernel': ellipse_kernel(3)}),
+    },
+}
+
+# preset: Name of the chosen preset
+# seconds: Dict with the median seconds of every timed preset on the calibration image
+# differences: Dict with the mean absolute difference of every timed preset with the 'quality' result
+# psnr: Dict with the peak signal to noise ratio of every timed preset against the 'quality' result
+TuningReport = namedtuple('TuningReport', ['preset', 'seconds', 'differences', 'psnr'])
+
+
+def preset_params(operation, preset, **params):
+    """
+    Keyword arguments of an operation in a preset
+    :param operation: Operation of the library (function or registered name)
+    :param preset: 'fast', 'balanced' or 'quality'
+    :param params: Keyword arguments overriding those of the preset
+    :return: Dict with the keyword arguments and working resolution of the operation
+    """
+    if preset not in PRESETS:
+        raise ValueError(f"Unknown preset {preset!r}, expected one of {', '.join(PRESET_NAMES)}")
+    entry = PRESETS[preset].get(operation_name(operation), Preset({}))
+    return {**entry.params, **params}, entry.scale
+
+
+def __at_scale__(function, image, scale, output):
+    """
+    Run an operation on the image reduced by scale and add the enlarged changes it made to the image
+    :param function: Function of the reduced LazyImage running the operation
+    :param image: LazyImage
+    :param scale: Factor the image is reduced by, below 1
+    :param output: Order of the result of the operation, 'rgb' or 'bgr'
+    :return: Result of the operation at the size of the image
+    """
+    matrix, order = image.interleaved('bgr')
+    small = LazyImage(cv2.resize(matrix, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA),
+                      'bgr' if order is None else 'rgb')
+    result = function(small)
+    result, extra = (result[0], result[1:]) if isinstance(result, tuple) else (result, ())
+
+    reference, full = (small.rgb, image.rgb) if output == 'rgb' else (small.original, image.original)
+    changes = cv2.subtract(result, reference, dtype=cv2.CV_16S)
+    changes = cv2.resize(changes, (full.shape[1], full.shape[0]), interpolation=cv2.INTER_LINEAR)
+    result = cv2.add(full, changes, dtype=cv2.CV_8U)
+    if not extra:
+        return result
+    # Masks returned with the result are enlarged to the size of the image
+    extra = [cv2.resize(value, (full.shape[1], full.shape[0]), interpolation=cv2.INTER_NEAREST)
+             if isinstance(value, np.ndarray) and value.shape[:2] == small.shape[:2] else value for value in extra]
+    return (result, *extra)
+
+
+def apply_preset(operation, image, preset='balanced', **params):
+    """
+    Apply an operation with the parameters and working resolution of a preset
+    Ex: apply_preset('artifacts_removal.dull_razor_artifact_removal', image, 'fast')
+    :param operation: Operation of the library (function or registered name)
+    :param image: Path to Image, 3D Matrix representing RGB image or LazyImage
+    :param preset: 'fast', 'balanced' or 'quality'
+    :param params: Keyword arguments overriding those of the preset
+    :return: Result of the operation
+    """
+    name = operation_name(operation)
+    params, scale = preset_params(name, preset, **params)
+    function = OPERATIONS[name].function
+    image = __lazy_image__(image)
+    if scale == 1:
+        return function(image, **params)
+    return __at_scale__(lambda small: function(small, **params), image, scale, OPERATIONS[name].output)
+
+
+def auto_tune(operation, image, budget, repeat=3, **params):
+    """
+    Time the presets of an operation on a calibration image, from 'fast' to 'quality', and pick the most
+    accurate one whose median time fits the budget. Presets after the first one over the budget are not
+    timed. The 'quality' result is always computed, once and untimed when it is not timed, as the reference
+    of the differences. The time depends on the image size, so the calibration image should have the size of
+    the images to process.
+    :param operation: Operation of the library (function or registered name)
+    :param image: Path to Image, 3D Matrix representing RGB image or LazyImage used for calibration
+    :param budget: Seconds per image
+    :param repeat: Number of timed runs of every preset
+    :param params: Keyword arguments overriding those of the presets
+    :return: TuningReport with differences and PSNR against 'quality'. The preset is 'fast' when no preset
+    fits the budget
+    """
+    matrix, order = __lazy_image__(image).interleaved('bgr')
+    name = operation_name(operation)
+    seconds, results = {}, {}
+
+    def first(result):
+        return result[0] if isinstance(result, tuple) else result
+
+    for preset in PRESET_NAMES:
+        times = []
+        while len(times) < repeat and (not times or times[-1] <= budget):
+            # A new LazyImage every run, so the planes cached by a run do not speed up the next one
+            calibration = LazyImage(matrix, 'bgr' if order is None else 'rgb')
+            start = time.perf_counter()
+            result = apply_preset(name, calibration, preset, **params)
+            times.append(time.perf_counter() - start)
+        seconds[preset] = float(np.median(times))
+        results[preset] = first(result)
+        if seconds[preset] > budget:
+            break
+
+    if 'quality' in results:
+        reference = results['quality']
+    else:
+        reference = first(apply_preset(name, LazyImage(matrix, 'bgr' if order is None else 'rgb'), 'quality',
+                                       **params))
+    differences = {preset: float(cv2.absdiff(result, reference).mean()) for preset, result in results.items()}
+    psnr = {preset: cv2.PSNR(result, reference) for preset, result in results.items()}
+    chosen = next((preset for preset in reversed(results) if seconds[preset] <= budget), PRESET_NAMES[0])
+    return TuningReport(chosen, seconds, differences, psnr)
+
+
+class PresetTuner:
+    """
+    Applies an operation with the best preset meeting a time budget for every image size. The first image of
+    each size is used to calibrate the presets on this machine.
+    Ex:
+        tuner = PresetTuner('artifacts_removal.dull_razor_artifact_removal', budget=0.05)
+        result = tuner(image)
+        print(tuner.reports)
+    """
+
+    def __init__(self, operation, budget, repeat=3, **params):
+        """
+        :param operation: Operation of the library (function or registered name)
+        :param budget: Seconds per image
+        :param repeat: Number of timed runs of every preset in a calibration
+        :param params: Keyword arguments overriding those of the presets
+        """
+        self.operation = operation_name(operation)
+        self.budget = budget
+        self.repeat = repeat
+        self.params = params
+        # TuningReport of every calibrated (height, width)
+        self.reports = {}
+
+    def preset(self, image):
+        """
+        :param image: Path to Image, 3D Matrix representing RGB image or LazyImage
+        :return: Name of the preset chosen for the size of the image, calibrating it on the image if needed
+        """
+        image = __lazy_image__(image)
+        size = image.shape[:2]
+        if size not in self.reports:
+            self.reports[size] = auto_tune(self.operation, image, self.budget, self.repeat, **self.params)
+        return self.reports[size].preset
+
+    def __call__(self, image):
+        image = __lazy_image__(image)
+        return apply_preset(self.operation, image, self.preset(image), **self.params)
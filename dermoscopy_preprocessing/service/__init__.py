@@ -0,0 +1 @@
+from .service import AsyncProcessor, decode_image
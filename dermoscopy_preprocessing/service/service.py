@@ -0,0 +1,162 @@
+import asyncio
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+import cv2
+
+from ..utils import LazyImage
+from ..pipeline import Pipeline, OPERATIONS, operation_name
+from ..cache.cache import __hash_value__
+from ..instrumentation import stage
+
+# Types of the encoded images received by the processor, decoded with cv2.imdecode
+ENCODED_TYPES = (bytes, bytearray, memoryview)
+
+
+def decode_image(data):
+    """
+    Decode an image file held in memory, like an HTTP upload
+    :param data: Bytes of a PNG, JPEG, etc file
+    :return: LazyImage of the decoded image
+    """
+    with stage('decode') as frame:
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("Could not decode image")
+        if frame is not None:
+            frame[3] = image.shape
+    return LazyImage(image)
+
+
+def __apply__(function, image):
+    if isinstance(image, ENCODED_TYPES):
+        image = decode_image(image)
+    return function(image)
+
+
+def __set_result__(future, result):
+    if not future.done():
+        future.set_result(result)
+
+
+def __set_exception__(future, error):
+    if not future.done():
+        future.set_exception(error)
+
+
+def __run_batch__(function, batch, loop):
+    """
+    Apply a function to every image of a batch in a worker thread, skipping requests cancelled meanwhile
+    :param batch: List of (image, asyncio future receiving the result)
+    """
+    for image, future in batch:
+        if future.cancelled():
+            continue
+        try:
+            result = __apply__(function, image)
+        except Exception as error:
+            loop.call_soon_threadsafe(__set_exception__, future, error)
+        else:
+            loop.call_soon_threadsafe(__set_result__, future, result)
+
+
+class AsyncProcessor:
+    """
+    Runs operations and pipelines of the library from asyncio code without blocking the event loop.
+    Work is done in a bounded pool of threads, where OpenCV releases the GIL. Images can be given as
+    the bytes of an encoded file, which are decoded in the pool too.
+    The number of requests waiting or in process is bounded: further requests wait for a slot, which
+    propagates back-pressure to the callers. Cancelling a request removes it if it has not started.
+    With batch_size > 1, requests of the same operation and parameters arriving within batch_delay seconds
+    are processed together in one task of the pool.
+    Ex:
+        async with AsyncProcessor(workers=4) as processor:
+            result = await processor.run('contrast.clahe', upload_bytes, clip_limit=3)
+    """
+
+    def __init__(self, workers=None, max_pending=None, batch_size=1, batch_delay=0.005):
+        """
+        :param workers: Number of threads, number of CPUs by default
+        :param max_pending: Maximum number of requests waiting or in process, 4 * workers by default
+        :param batch_size: Maximum number of requests processed together
+        :param batch_delay: Seconds a batch waits for more requests before it is processed
+        """
+        self.workers = workers or os.cpu_count()
+        self.max_pending = max_pending or 4 * self.workers
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.__executor__ = ThreadPoolExecutor(self.workers, thread_name_prefix='dermoscopy_preprocessing')
+        self.__semaphore__ = asyncio.Semaphore(self.max_pending)
+        self.__batches__ = {}
+
+    def __function__(self, operation, params):
+        """
+        :return: Function of the image applying the operation, and the key of the batches it can join
+        """
+        if isinstance(operation, Pipeline):
+            return operation, ('pipeline', id(operation))
+        name = operation_name(operation)
+        hasher = hashlib.blake2b(name.encode(), digest_size=16)
+        __hash_value__(hasher, params)
+        return partial(OPERATIONS[name].function, **params), hasher.hexdigest()
+
+    async def run(self, operation, image, **params):
+        """
+        Apply an operation or pipeline to an image in the pool
+        :param operation: Operation of the library (function or registered name) or Pipeline
+        :param image: Bytes of an encoded image, 3D Matrix representing image in BGR order or LazyImage
+        :param params: Keyword arguments of the operation
+        :return: Result of the operation
+        """
+        function, key = self.__function__(operation, params)
+        loop = asyncio.get_running_loop()
+        async with self.__semaphore__:
+            if self.batch_size <= 1:
+                return await loop.run_in_executor(self.__executor__, __apply__, function, image)
+
+            future = loop.create_future()
+            if key not in self.__batches__:
+                self.__batches__[key] = (function, [])
+                loop.call_later(self.batch_delay, self.__flush__, key, self.__batches__[key][1], loop)
+            batch = self.__batches__[key][1]
+            batch.append((image, future))
+            if len(batch) >= self.batch_size:
+                self.__flush__(key, batch, loop)
+            return await future
+
+    def __flush__(self, key, batch, loop):
+        """
+        Submit a batch to the pool, once, when it is full or its delay expires
+        """
+        if key not in self.__batches__ or self.__batches__[key][1] is not batch:
+            return
+        function, batch = self.__batches__.pop(key)
+        if not all(future.cancelled() for _, future in batch):
+            loop.run_in_executor(self.__executor__, __run_batch__, function, batch, loop)
+
+    @property
+    def full(self):
+        """
+        True if every slot is taken, so new requests will wait. Services can use it to reject requests
+        """
+        return self.__semaphore__.locked()
+
+    def close(self, wait=True):
+        """
+        Shut down the pool
+        :param wait: Wait for the requests submitted to the pool. If False those not started are cancelled
+        """
+        self.__executor__.shutdown(wait, cancel_futures=not wait)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        # Batches still waiting for their delay are processed before the pool shuts down
+        loop = asyncio.get_running_loop()
+        for key, (_, batch) in list(self.__batches__.items()):
+            self.__flush__(key, batch, loop)
+        await loop.run_in_executor(None, self.close)
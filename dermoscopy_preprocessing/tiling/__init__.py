@@ -0,0 +1 @@
+from .tiling import process_tiled, operation_halo
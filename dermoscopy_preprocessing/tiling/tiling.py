@@ -0,0 +1,156 @@
+import numpy as np
+
+from ..utils import LazyImage, __otsu_threshold__, HAIR_ANGLES
+from ..pipeline import Pipeline, OPERATIONS, operation_name
+from ..artifacts_removal.artifacts import __bothat_histograms__
+
+# Extra halo of inpainting beyond its radius. The inpainted value of a pixel propagates from the border of its
+# masked region, so results are the same as on the whole image for masked regions up to twice this width
+INPAINT_MARGIN = 32
+
+
+def __radius__(kernel):
+    if isinstance(kernel, (list, tuple)) and kernel and isinstance(kernel[0], np.ndarray):
+        # List of kernels of a multi-scale operation
+        return max(__radius__(item) for item in kernel)
+    return max(np.shape(kernel)) // 2
+
+
+# Halo of every operation that only depends on a neighbourhood of each pixel: function receiving the
+# parameters of the operation and returning the number of pixels around a tile it needs.
+# Operations missing here use global statistics of the image and can not be tiled.
+HALOS = {
+    'contrast.window_enhancement': lambda params: 0,
+    'contrast.morphological_contrast_enhancement': lambda params: 2 * __radius__(params['kernel']),
+    'contrast.reverse_morphological_contrast_enhancement': lambda params: 2 * __radius__(params['kernel']),
+    'edges.sharpen': lambda params: __radius__(params['kernel']),
+    'edges.laplacian': lambda params: 1,
+    'edges.unsharp_filter': lambda params: 2,
+    'ilumination.mul_log_brightness_enhancement': lambda params: 0,
+    'artifacts_removal.morphological_closure_artifact_removal':
+        lambda params: 2 * params.get('blur', True) + 2 * __radius__(params['kernel']),
+    'artifacts_removal.dull_razor_artifact_removal':
+        lambda params: 2 * __radius__(params['kernel']) + params.get('inpaint_radius', 1) + INPAINT_MARGIN,
+    'artifacts_removal.bothat_artifact_removal':
+        lambda params: 1 + 1 + 8 + __radius__(params['kernel']) + params.get('inpaint_radius', 1) + INPAINT_MARGIN,
+    'artifacts_removal.laplasian_of_gaussian':
+        lambda params: 5 + 2 + 2 + params.get('inpaint_radius', 3) + INPAINT_MARGIN,
+}
+
+# Parameters of every operation that are matrices with a value per pixel of the image, sliced like the image for
+# every tile
+REGION_PARAMS = {
+    'edges.unsharp_filter': ('mask',),
+}
+
+# Operations whose global statistics can be accumulated over tiles: name of the parameter they give, function
+# computing the statistics of the interior of a tile, and function computing the parameter from the statistics
+# summed over every tile. They are only needed when the parameter is not given.
+STATISTICS = {
+    'artifacts_removal.bothat_artifact_removal': (
+        'thresholds',
+        lambda tile, params, region: __bothat_histograms__(tile, region, params.get('angles', HAIR_ANGLES),
+                                                          params.get('mask_source')),
+        lambda hists: tuple(__otsu_threshold__(hist) for hist in hists)),
+}
+
+
+def operation_halo(operation, params=None):
+    """
+    Number of pixels around a tile an operation needs to produce the same result as on the whole image
+    :param operation: Operation of the library (function or registered name) or Pipeline
+    :param params: Keyword arguments of the operation
+    :return: Halo in pixels
+    """
+    steps = operation.steps if isinstance(operation, Pipeline) else [(operation_name(operation), params or {})]
+
+    halo = 0
+    for name, step_params in steps:
+        if name not in HALOS:
+            raise ValueError(f"{name} uses global statistics of the image and can not be tiled")
+        if name in STATISTICS and STATISTICS[name][0] not in step_params and isinstance(operation, Pipeline):
+            raise ValueError(f"{name} needs '{STATISTICS[name][0]}' to be tiled inside a pipeline")
+        sliced = [param for param in REGION_PARAMS.get(name, ()) if step_params.get(param) is not None]
+        if sliced and isinstance(operation, Pipeline):
+            raise ValueError(f"{name} can not be tiled inside a pipeline with '{sliced[0]}', which is per pixel")
+        halo += HALOS[name](step_params)
+    return halo
+
+
+def __source__(source):
+    """
+    Matrix like source of an image: matrix, memory map or any object sliced as a matrix.
+    Paths to .npy files are memory mapped, any other path is decoded.
+    """
+    if isinstance(source, str):
+        if source.endswith('.npy'):
+            return np.load(source, mmap_mode='r')
+        return LazyImage(source).original
+    return source
+
+
+def __tiles__(shape, tile_size, halo):
+    """
+    Generate the tiles covering an image
+    :return: Tuples of the tile slices with halo, and the slices of the tile interior in the image and in the tile
+    """
+    height, width = shape[:2]
+    for y in range(0, height, tile_size):
+        for x in range(0, width, tile_size):
+            y1, x1 = min(y + tile_size, height), min(x + tile_size, width)
+            ya, xa = max(y - halo, 0), max(x - halo, 0)
+            yb, xb = min(y1 + halo, height), min(x1 + halo, width)
+            yield (slice(ya, yb), slice(xa, xb)), (slice(y, y1), slice(x, x1)), \
+                (slice(y - ya, y1 - ya), slice(x - xa, x1 - xa))
+
+
+def process_tiled(operation, source, out=None, params=None, tile_size=1024, halo=None, order='bgr'):
+    """
+    Apply an operation on overlapping tiles, so peak memory depends on the tile size and not on the image size.
+    Every tile is extended by the halo of the operation, which gives the same result as processing the whole image.
+    Inpainted regions wider than 2 * INPAINT_MARGIN may differ slightly near the tile borders.
+    :param operation: Operation of the library (function or registered name) or Pipeline
+    :param source: Path to image or .npy file (memory mapped), or matrix like object sliced by tiles
+    :param out: Optional path of a .npy file written tile by tile, or matrix like object receiving the result.
+    A matrix is allocated by default
+    :param params: Keyword arguments of the operation
+    :param tile_size: Size of the side of the tiles, without halo
+    :param halo: Pixels around every tile, computed from the kernels of the operation by default
+    :param order: Channel order of the source, 'bgr' or 'rgb'
+    :return: Resulting image, in the channel order returned by the operation
+    """
+    params = dict(params or {})
+    if not isinstance(operation, Pipeline):
+        operation = operation_name(operation)
+    if halo is None:
+        halo = operation_halo(operation, params)
+
+    source = __source__(source)
+    tiles = list(__tiles__(source.shape, tile_size, halo))
+
+    def run(tile, region):
+        tile = LazyImage(np.ascontiguousarray(tile), order)
+        if isinstance(operation, Pipeline):
+            return operation(tile)
+        tile_params = {**params, **{name: params[name][region] for name in REGION_PARAMS.get(operation, ())
+                                    if params.get(name) is not None}}
+        result = OPERATIONS[operation].function(tile, **tile_params)
+        return result[0] if isinstance(result, tuple) else result
+
+    if isinstance(operation, str) and operation in STATISTICS and STATISTICS[operation][0] not in params:
+        name, collect, finalize = STATISTICS[operation]
+        statistics = sum(collect(LazyImage(np.ascontiguousarray(source[region]), order), params, inner)
+                         for region, _, inner in tiles)
+        params[name] = finalize(statistics)
+
+    for region, interior, inner in tiles:
+        result = run(source[region], region)[inner]
+        if out is None or isinstance(out, str):
+            shape = source.shape[:2] + result.shape[2:]
+            out = np.lib.format.open_memmap(out, 'w+', result.dtype, shape) if isinstance(out, str) \
+                else np.empty(shape, result.dtype)
+        out[interior] = result
+
+    if isinstance(out, np.memmap):
+        out.flush()
+    return out
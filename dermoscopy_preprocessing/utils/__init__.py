@@ -1,4 +1,19 @@
 from .utils import __image__, histogram
-from .utils import CIRCLE_KERNEL_9X9, CIRCLE_KERNEL_5X5, CIRCLE_KERNEL_3X3, CIRCLE_KERNEL_7X7, CIRCLE_KERNEL_4X4, CIRCLE_KERNEL_11X11
+from .image import LazyImage, __lazy_image__
+from .channels import __map_channels__, BGR_TO_RGB
+from .histograms import __otsu_threshold__
+from .lut import point_lut, compose_luts
+from .stack import stacked, map_stack, is_stack
+from .kernels import line_kernel, line_kernels, log_mask, gaussian_kernel, ellipse_kernel, HAIR_ANGLES
+from .utils import CIRCLE_KERNEL_SIZES
 from .utils import WEIGTHS
-from .utils import SHARPEN_KERNEL, RHOMB_KERNEL_3X3, STAR_KERNEL_3X3
\ No newline at end of file
+from .utils import SHARPEN_KERNEL, RHOMB_KERNEL_3X3, STAR_KERNEL_3X3
+from . import utils as _utils
+
+
+def __getattr__(name):
+    # CIRCLE_KERNEL_* constants are built on first access
+    if name in CIRCLE_KERNEL_SIZES:
+        kernel = globals()[name] = getattr(_utils, name)
+        return kernel
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
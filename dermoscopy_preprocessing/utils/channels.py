@@ -0,0 +1,30 @@
+import numpy as np
+import cv2
+
+# Channels of a BGR image in RGB order
+BGR_TO_RGB = (2, 1, 0)
+
+
+def __map_channels__(func, image, order=None, out=None):
+    """
+    Apply a single channel operation to every channel of an interleaved image.
+    Each channel is copied to one reusable plane and its result is written directly
+    in the output buffer, instead of splitting into three planes and merging the results.
+    :param func: Function receiving a 2D plane and returning the processed 2D plane
+    :param image: 3D matrix with interleaved channels
+    :param order: Channel of image written in each output channel, BGR_TO_RGB returns a BGR image in RGB order.
+    Default keeps the channel order
+    :param out: Optional preallocated 3D matrix where the result is written
+    :return: 3D matrix with the processed channels
+    """
+    channels = image.shape[2]
+    order = range(channels) if order is None else order
+
+    plane = np.empty(image.shape[:2], image.dtype)
+    for index, channel in enumerate(order):
+        cv2.extractChannel(image, channel, dst=plane)
+        result = func(plane)
+        if out is None:
+            out = np.empty(image.shape[:2] + (channels,), result.dtype)
+        cv2.insertChannel(result, out, index)
+    return out
@@ -0,0 +1,32 @@
+import numpy as np
+
+FLT_EPSILON = np.finfo(np.float32).eps
+
+
+def __otsu_threshold__(hist):
+    """
+    Otsu threshold of a 256 bins histogram, the same value cv2.threshold with THRESH_OTSU finds on the image.
+    Allows computing the threshold from histograms accumulated over several tiles or estimated on a smaller image.
+    :param hist: Histogram of an 8 bits image
+    :return: Threshold
+    """
+    hist = np.asarray(hist, np.float64).ravel()
+    scale = 1. / hist.sum()
+    mu = float(np.dot(np.arange(256), hist)) * scale
+
+    mu1, q1 = 0., 0.
+    max_sigma, max_val = 0., 0.
+    for i in range(256):
+        p_i = hist[i] * scale
+        mu1 *= q1
+        q1 += p_i
+        q2 = 1. - q1
+        if min(q1, q2) < FLT_EPSILON or max(q1, q2) > 1. - FLT_EPSILON:
+            continue
+        mu1 = (mu1 + i * p_i) / q1
+        mu2 = (mu - q1 * mu1) / q2
+        sigma = q1 * q2 * (mu1 - mu2) * (mu1 - mu2)
+        if sigma > max_sigma:
+            max_sigma = sigma
+            max_val = i
+    return max_val
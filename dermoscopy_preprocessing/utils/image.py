@@ -0,0 +1,127 @@
+from functools import cached_property
+
+import cv2
+
+from .channels import BGR_TO_RGB
+from ..instrumentation.instrumentation import stage
+
+# Attribute holding a matrix given in each channel order
+__ORDERS__ = {'bgr': 'original', 'rgb': 'rgb', 'gray': 'gray'}
+
+
+class LazyImage:
+    """
+    Image decoded once. The decoded matrix and every plane derived from it (channels, gray, RGB)
+    are computed on first access and cached, so operations chained on the same LazyImage
+    never decode the file twice nor build planes they do not use.
+    """
+
+    def __init__(self, image, order='bgr'):
+        """
+        :param image: Path to image file or matrix representing the image
+        :param order: Channel order of a matrix: 'bgr' as read by cv2.imread, 'rgb' as returned by
+        most operations of the library, or 'gray' for a 2D matrix
+        """
+        self.path = image if isinstance(image, str) else None
+        if self.path is None:
+            self.__dict__[__ORDERS__[order]] = image
+
+    @cached_property
+    def original(self):
+        """
+        Decoded image in BGR order
+        """
+        if self.path is not None:
+            with stage('decode') as frame:
+                original = cv2.imread(self.path)
+                if original is None:
+                    raise FileNotFoundError(f"Could not read image {self.path}")
+                if frame is not None:
+                    frame[3] = original.shape
+                return original
+        if 'rgb' in self.__dict__:
+            with stage('convert', self.rgb):
+                return cv2.cvtColor(self.rgb, cv2.COLOR_RGB2BGR)
+        with stage('convert', self.gray):
+            return cv2.cvtColor(self.gray, cv2.COLOR_GRAY2BGR)
+
+    def interleaved(self, order='rgb'):
+        """
+        Matrix already holding the three channels, without converting its channel order
+        :param order: Channel order the caller wants to read, 'rgb' or 'bgr'
+        :return: Matrix and the channel order to read it in the requested order, as expected by __map_channels__
+        """
+        if 'original' in self.__dict__ or 'rgb' not in self.__dict__:
+            return self.original, None if order == 'bgr' else BGR_TO_RGB
+        return self.rgb, None if order == 'rgb' else BGR_TO_RGB
+
+    def __plane__(self, index):
+        matrix, order = self.interleaved()
+        return cv2.extractChannel(matrix, index if order is None else order[index])
+
+    @cached_property
+    def red(self):
+        return self.__plane__(0)
+
+    @cached_property
+    def green(self):
+        return self.__plane__(1)
+
+    @cached_property
+    def blue(self):
+        return self.__plane__(2)
+
+    @property
+    def channels(self):
+        """
+        Red, green and blue planes
+        """
+        return self.red, self.green, self.blue
+
+    @cached_property
+    def gray(self):
+        matrix, order = self.interleaved('bgr')
+        with stage('convert', matrix):
+            return cv2.cvtColor(matrix, cv2.COLOR_BGR2GRAY if order is None else cv2.COLOR_RGB2GRAY)
+
+    @cached_property
+    def rgb(self):
+        """
+        Image in RGB order
+        """
+        original = self.original
+        with stage('convert', original):
+            return cv2.cvtColor(original, cv2.COLOR_BGR2RGB)
+
+    @property
+    def shape(self):
+        matrix, _ = self.interleaved()
+        return matrix.shape
+
+    def level(self, level):
+        """
+        Level of a pyramid of the image, sampling one pixel out of 2 ** level in each direction.
+        Levels are computed once and let global statistics be estimated on fewer pixels. The pixels
+        are sampled rather than smoothed as cv2.pyrDown does, which would narrow the histograms.
+        :param level: Level of the pyramid, 0 for the image itself
+        :return: LazyImage of the level
+        """
+        if level == 0:
+            return self
+        levels = self.__dict__.setdefault('levels', {})
+        if level not in levels:
+            matrix, order = self.interleaved('bgr')
+            step = 2 ** level
+            levels[level] = LazyImage(matrix[::step, ::step].copy(), 'bgr' if order is None else 'rgb')
+        return levels[level]
+
+
+def __lazy_image__(image):
+    """
+    Wrap an image in a LazyImage
+    :param image: Path to image file, 3D-matrix representing the image or LazyImage
+    :return: The same LazyImage or a new one wrapping image
+    """
+    if isinstance(image, LazyImage):
+        return image
+    return LazyImage(image)
@@ -0,0 +1,85 @@
+import math
+from functools import lru_cache
+
+import numpy as np
+import cv2
+
+# Orientations of the line kernels used for hair detection, in degrees
+HAIR_ANGLES = (0, 90, 45, 135)
+
+
+def __read_only__(kernel):
+    kernel.setflags(write=False)
+    return kernel
+
+
+@lru_cache(maxsize=None)
+def line_kernel(size, angle):
+    """
+    Structuring element of a one pixel wide line through the center of the kernel.
+    Kernels are built once for each size and angle and shared, so they are read only.
+    :param size: Odd size of the side of the kernel, which is the length of the line
+    :param angle: Angle of the line in degrees, counterclockwise from horizontal. 45 joins the bottom left
+    and top right corners
+    :return: Kernel of size x size
+    """
+    center = size // 2
+    theta = math.radians(angle)
+    dx, dy = math.cos(theta), -math.sin(theta)
+    steps = np.arange(-center, center + 1)
+
+    # One pixel per column for lines closer to horizontal, one per row otherwise
+    if abs(dx) >= abs(dy):
+        rows, cols = center + np.rint(steps * dy / dx), center + steps
+    else:
+        rows, cols = center + steps, center + np.rint(steps * dx / dy)
+
+    kernel = np.zeros((size, size), np.uint8)
+    kernel[rows.astype(int), cols.astype(int)] = 1
+    return __read_only__(kernel)
+
+
+def line_kernels(size=9, angles=HAIR_ANGLES):
+    """
+    Line kernels of several orientations
+    :param size: Odd size of the side of the kernels
+    :param angles: Angles of the lines in degrees
+    :return: Tuple with one kernel per angle
+    """
+    return tuple(line_kernel(size, angle) for angle in angles)
+
+
+@lru_cache(maxsize=None)
+def log_mask(n, sigma2):
+    """
+    Laplacian of Gaussian mask
+    :param n: Size of the side of the mask
+    :param sigma2: Variance of the Gaussian
+    :return: Mask of n x n
+    """
+    x = np.arange(n) - (n - 1) // 2
+    temp = (x[:, None] ** 2 + x[None, :] ** 2) / (2 * sigma2)
+    mask = (-1 / (math.pi * sigma2 ** 2)) * (1 - temp) * np.power(math.e, -temp)
+    return __read_only__(mask)
+
+
+@lru_cache(maxsize=None)
+def gaussian_kernel(ksize, sigma):
+    """
+    Gaussian kernel returned by cv2.getGaussianKernel, computed once
+    :param ksize: Size of the kernel
+    :param sigma: Standard deviation
+    :return: Column vector of ksize x 1
+    """
+    return __read_only__(cv2.getGaussianKernel(ksize, sigma))
+
+
+@lru_cache(maxsize=None)
+def ellipse_kernel(width, height=None):
+    """
+    Elliptic structuring element returned by cv2.getStructuringElement, computed once
+    :param width: Width of the kernel
+    :param height: Height of the kernel, width by default
+    :return: Kernel
+    """
+    return __read_only__(cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (width, height or width)))
@@ -0,0 +1,28 @@
+import numpy as np
+
+from .kernels import __read_only__
+
+# Point transforms map every level of an 8 bits image to another level, so they are computed once
+# on the 256 levels and applied with cv2.LUT
+
+
+def point_lut(transform):
+    """
+    Lookup table of a point transform
+    :param transform: Function of an array of levels returning the transformed levels, cast to 8 bits
+    :return: Read only uint8 array of 256 entries
+    """
+    return __read_only__(np.asarray(transform(np.arange(256)), np.uint8))
+
+
+def compose_luts(luts):
+    """
+    Lookup table applying several lookup tables one after the other
+    :param luts: Lookup tables of 256 entries, in the order they are applied
+    :return: Read only uint8 array of 256 entries
+    """
+    luts = [np.asarray(lut).ravel() for lut in luts]
+    result = luts[0]
+    for lut in luts[1:]:
+        result = lut[result]
+    return __read_only__(np.array(result, np.uint8))
@@ -0,0 +1,85 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+import numpy as np
+
+
+def is_stack(images):
+    """
+    :param images: Argument given as image to an operation
+    :return: True for a N x H x W x 3 matrix or a list of matrices
+    """
+    if isinstance(images, np.ndarray):
+        return images.ndim == 4
+    return isinstance(images, list) and len(images) > 0 and all(isinstance(item, np.ndarray) for item in images)
+
+
+def __same_buffer__(result, target):
+    return isinstance(result, np.ndarray) and result.ctypes.data == target.ctypes.data and result.shape == target.shape
+
+
+def map_stack(function, images, out=None, workers=None, accepts_out=False):
+    """
+    Apply a single image function to every image of a stack, writing the results in one stack.
+    The first image is processed in the calling thread, so kernels, lookup tables and other objects cached
+    by the operation are built once, and the rest are split across threads, as OpenCV releases the GIL.
+    :param function: Function of an image returning an image, or a tuple of an image and other values
+    :param images: N x H x W x 3 matrix or list of matrices of the same size, in BGR order
+    :param out: Optional preallocated stack where the results are written
+    :param workers: Number of threads, number of CPUs by default
+    :param accepts_out: If True the function writes its result in the out= matrix it is given
+    :return: Stack of the results, or a tuple of the stack and a list of every other value returned
+    """
+    count = len(images)
+
+    def split(result):
+        return (result[0], result[1:]) if isinstance(result, tuple) else (result, None)
+
+    first, extra = split(function(images[0], out=out[0]) if accepts_out and out is not None
+                         else function(images[0]))
+    if out is None:
+        out = np.empty((count,) + first.shape, first.dtype)
+    if not __same_buffer__(first, out[0]):
+        out[0] = first
+    extras = [extra] + [None] * (count - 1)
+
+    def run(index):
+        target = out[index]
+        result, extras[index] = split(function(images[index], out=target) if accepts_out
+                                      else function(images[index]))
+        if not __same_buffer__(result, target):
+            target[...] = result
+
+    workers = min(workers or os.cpu_count(), count - 1)
+    if workers <= 1:
+        for index in range(1, count):
+            run(index)
+    else:
+        with ThreadPoolExecutor(workers) as executor:
+            # list raises the first error of the workers
+            list(executor.map(run, range(1, count)))
+
+    if extra is None:
+        return out
+    return (out, *[list(values) for values in zip(*extras)])
+
+
+def stacked(function):
+    """
+    Decorator letting an operation also receive a stack of images: a N x H x W x 3 matrix or a list of
+    matrices of the same size. For a stack, the out= argument is the stack receiving the results and
+    workers= the number of threads, and the operation returns the stack of results.
+    """
+    code = getattr(function, '__wrapped__', function).__code__
+    accepts_out = 'out' in code.co_varnames[:code.co_argcount + code.co_kwonlyargcount]
+
+    @wraps(function)
+    def wrapper(image, *args, **kwargs):
+        if not is_stack(image):
+            return function(image, *args, **kwargs)
+        out = kwargs.pop('out', None)
+        workers = kwargs.pop('workers', None)
+        return map_stack(lambda item, **out_kwargs: function(item, *args, **kwargs, **out_kwargs), image, out,
+                         workers, accepts_out)
+    return wrapper
@@ -1,18 +1,15 @@
 
 import numpy as np
-import matplotlib.pyplot as plt
 import cv2
+from .image import LazyImage, __lazy_image__
 
 HEXAGON_KERNEL_5X5 = np.array([[0, 1, 1, 1, 0], [1, 1, 1, 1, 1], [1, 1, 1, 1, 1], [1, 1, 1, 1, 1], [0, 1, 1, 1, 0]],
                               np.uint8)
 RHOMB_KERNEL_3X3 = np.array([[0, 1, 0], [1, 1, 1], [0, 1, 0]], np.uint8)
 STAR_KERNEL_3X3 = np.array([[1, 0, 1], [0, 1, 0], [1, 0, 1]], np.uint8)
-CIRCLE_KERNEL_3X3 = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
-CIRCLE_KERNEL_4X4 = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (4, 4))
-CIRCLE_KERNEL_9X9 = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (9, 9))
-CIRCLE_KERNEL_5X5 = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
-CIRCLE_KERNEL_7X7 = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (7, 7))
-CIRCLE_KERNEL_11X11 = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (11, 11))
+# Size of the CIRCLE_KERNEL_* constants, built on first access by __getattr__
+CIRCLE_KERNEL_SIZES = {'CIRCLE_KERNEL_3X3': 3, 'CIRCLE_KERNEL_4X4': 4, 'CIRCLE_KERNEL_5X5': 5, 'CIRCLE_KERNEL_7X7': 7,
+                       'CIRCLE_KERNEL_9X9': 9, 'CIRCLE_KERNEL_11X11': 11}
 SHARPEN_KERNEL = np.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]])
 
 WEIGTHS = [[0.2, 0.2, 0.6],
@@ -27,24 +24,25 @@ WEIGTHS = [[0.2, 0.2, 0.6],
            [0.3, 0.3, 0.4]]
 
 
+def __getattr__(name):
+    """
+    Build a CIRCLE_KERNEL_* constant on first access, so importing the module does not call OpenCV
+    """
+    if name not in CIRCLE_KERNEL_SIZES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    size = CIRCLE_KERNEL_SIZES[name]
+    kernel = globals()[name] = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (size, size))
+    return kernel
+
+
 def __image__(image):
     """
     Read image from path to file or matrix
-    :param image: path to image file or 3D-matrix representing RGB image
+    :param image: path to image file, 3D-matrix representing RGB image or LazyImage
     :return: Original image, channels red, green, blue and gray image
     """
-    original_image = image
-    if isinstance(image,str):
-        original_image = cv2.imread(image)
-    gray = cv2.cvtColor(original_image, cv2.COLOR_BGR2GRAY)
-    image = cv2.cvtColor(original_image, cv2.COLOR_BGR2RGB)
-
-    red, green, blue = cv2.split(image)
-    red = np.asarray(red)
-    green = np.asarray(green)
-    blue = np.asarray(blue)
-
-    return original_image, red, green, blue, gray
+    image = __lazy_image__(image)
+    return image.original, image.red, image.green, image.blue, image.gray
 
 
 def __plot_histogram__(hist):
@@ -53,8 +51,10 @@ def __plot_histogram__(hist):
     :param hist: Image histogram
     :return: Show Histogram plot
     """
+    # Imported here as importing matplotlib takes longer than the rest of the library
+    import matplotlib.pyplot as plt
     x = [i for i in range(256)]
-    plt.bar(x, histogram)
+    plt.bar(x, hist)
     plt.show()
 
 
@@ -64,8 +64,8 @@ def histogram(image):
     :param image: String with reference to image file or 2D-matrix representing image.
     :return: Image histogram
     """
-    if isinstance(image, str):
-        image, *_ = __image__(image)
+    if isinstance(image, (str, LazyImage)):
+        image = __lazy_image__(image).original
     hist = cv2.calcHist([image], [0], None, [256], [0, 256])
     hist = [hist[i][0] for i in range(256)]
     __plot_histogram__(hist)
@@ -18,5 +18,6 @@ setup(
     long_description_content_type=LONG_DESCRIPTION_TYPE,
     packages=find_packages(),
     install_requires=["opencv-python", "numpy"],
+    extras_require={"yaml": ["PyYAML"]},
     keywords=["python", "computer vision", "images", "dermoscopy"]
 )
@@ -0,0 +1,26 @@
+import numpy as np
+import cv2
+import pytest
+
+from dermoscopy_preprocessing import artifacts_removal
+from dermoscopy_preprocessing.utils import CIRCLE_KERNEL_5X5
+
+
+@pytest.fixture
+def image():
+    # Skin-like background with dark hair-like lines
+    rng = np.random.default_rng(0)
+    image = np.clip(rng.normal((120, 140, 190), 8, (96, 128, 3)), 0, 255).astype(np.uint8)
+    for offset in range(10, 120, 30):
+        cv2.line(image, (offset, 0), (offset + 20, 95), (30, 25, 20), 2)
+    return image
+
+
+@pytest.mark.parametrize('mask_source', [None, 'gray'])
+def test_bothat_thresholds_scalar_tuple_and_array(image, mask_source):
+    results = [artifacts_removal.bothat_artifact_removal(image, CIRCLE_KERNEL_5X5, thresholds=thresholds,
+                                                         mask_source=mask_source)
+               for thresholds in (10, (10, 10, 10), np.array([10, 10, 10]))]
+    assert all(np.array_equal(results[0], result) for result in results[1:])
+    assert not np.array_equal(results[0], artifacts_removal.bothat_artifact_removal(
+        image, CIRCLE_KERNEL_5X5, thresholds=250, mask_source=mask_source))